@@ -1,47 +1,38 @@
-import sendgrid
+import os
+
+import click
 from flask import Flask, current_app
-from flask_bcrypt import Bcrypt
+from jinja2 import FileSystemBytecodeCache
 from flask_login import LoginManager
-from flask_pymongo import PyMongo
 from itsdangerous import URLSafeTimedSerializer
 
-from app.models import User
+from app import fragments, metrics
+from app.cache import LRUCache, MongoCache
+from app.ids import IdAllocator
+from app.lazy import LazyObject
+from app.indexes import sync_indexes, check_indexes
+from app.mail import MailQueue, SendGridTransport, FakeTransport
+from app.models import User, Task
+from app.mongo import LazyMongo
+from app.passwords import PasswordHasher
 from app.pages import pages
 
 
-def setup_db():
+def setup_db(drop_indexes=False):
     db = current_app.mongo.db
-    db.users.create_index([('email', 'text')])
-    db.classes.create_index([('owner_id', 1)])
-    db.tasks.create_index([('owner_id', 1)])
-    db.tasks.create_index([('class_id', 1)])
-    db.counters.replace_one({'_id': 'user_id'}, {'seq': 0}, upsert=True)
+    sync_indexes(db, drop=drop_indexes)
+    db.counters.update_one({'_id': 'user_id'}, {'$setOnInsert': {'seq': 0}}, upsert=True)
 
 
 def send_email(subject, to_email, content):
-    sg = current_app.sg
-    data = {
-        "personalizations": [
-            {
-                "to": [
-                    {
-                        "email": to_email
-                    }
-                ],
-                "subject": subject
-            }
-        ],
-        "from": {
-            "email": current_app.config['SENDGRID_DEFAULT_FROM']
-        },
-        "content": [
-            {
-                "type": "text/html",
-                "value": content
-            }
-        ]
-    }
-    return sg.client.mail.send.post(request_body=data)
+    """Queue an email for delivery by the mail workers and return its id."""
+    return current_app.mail_queue.enqueue(subject, to_email, content)
+
+
+def create_mail_transport(app):
+    if app.config['MAIL_TRANSPORT'] == 'fake':
+        return FakeTransport()
+    return SendGridTransport(app.config['SENDGRID_API_KEY'], app.config['SENDGRID_DEFAULT_FROM'])
 
 
 def create_app():
@@ -52,18 +43,71 @@ def create_app():
     app.config.from_pyfile('application.cfg', silent=True)
 
     # Extension setup
-    app.bcrypt = Bcrypt(app)# -*- coding: utf-8 -*-
+    app.password_hasher = PasswordHasher(rounds=app.config['BCRYPT_LOG_ROUNDS'],
+                                         processes=app.config['BCRYPT_PROCESSES'],
+                                         max_pending=app.config['BCRYPT_MAX_PENDING'])
     app.login_manager = LoginManager(app)
-    app.login_manager.user_loader(lambda user_id: User(user_id, is_authenticated=True))
+    app.login_manager.user_loader(User.from_session)
     app.login_manager.login_view = 'pages.login'
     app.login_manager.needs_refresh_message = 'Please log in again to continue.'
-    app.mongo = PyMongo(app)
-    app.sg = sendgrid.SendGridAPIClient(apikey=app.config['SENDGRID_API_KEY'])
-    app.ts = URLSafeTimedSerializer(app.config['SECRET_KEY'])
+    metrics.init_app(app)
+    app.mongo = LazyMongo(app)  # Connects on first use in each process
+    app.user_ids = IdAllocator(lambda: app.mongo.db.counters, 'user_id', block_size=app.config['USER_ID_BLOCK_SIZE'])
+    app.mail_queue = MailQueue(app, LazyObject(lambda: create_mail_transport(app)))
+    app.ts = LazyObject(lambda: URLSafeTimedSerializer(app.config['SECRET_KEY']))
+    app.user_cache = LRUCache(app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+    app.calendar_cache = LRUCache(app.config['CALENDAR_CACHE_SIZE'])
+    app.search_cache = LRUCache(app.config['SEARCH_CACHE_SIZE'])
+    if app.config['FRAGMENT_CACHE_BACKEND'] == 'mongo':
+        app.fragment_cache = MongoCache(lambda: app.mongo.db.fragments)
+    else:
+        app.fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'])
+    if app.config['TEMPLATE_CACHE_DIR']:
+        # Compiled templates are read from disk instead of being compiled on each worker's first render of them
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=bytecode_cache)
+    app.jinja_env.globals.update(task_card=fragments.task_card, task_cards=fragments.task_cards,
+                                  class_card=fragments.class_card, class_cards=fragments.class_cards)
     # Blueprints
     app.register_blueprint(pages)
 
-    # with app.app_context():
-    #     setup_db()
+    @app.cli.command('send-mail')
+    def send_mail():
+        """Deliver every queued email that is due."""
+        app.mail_queue.drain()
+
+    @app.cli.command('sync-indexes')
+    @click.option('--drop', is_flag=True, help='Also drop indexes that are no longer registered.')
+    def sync_indexes_command(drop):
+        """Create the registered indexes and initialize the counters."""
+        setup_db(drop_indexes=drop)
+
+    @app.cli.command('repair-class-summaries')
+    def repair_class_summaries():
+        """Fix the class summaries copied onto tasks that drifted from their class."""
+        click.echo('Repaired {} tasks.'.format(Task.repair_class_summaries()))
+
+    @app.cli.command('compile-templates')
+    def compile_templates():
+        """Compile every template into the bytecode cache, e.g. while building a release."""
+        if not app.config['TEMPLATE_CACHE_DIR']:
+            raise click.ClickException('TEMPLATE_CACHE_DIR is not set.')
+        names = app.jinja_env.list_templates(extensions=['html'])
+        for name in names:
+            app.jinja_env.get_template(name)
+        click.echo('Compiled {} templates into {}.'.format(len(names), app.config['TEMPLATE_CACHE_DIR']))
+
+    @app.cli.command('check-indexes')
+    @click.option('--database', default='hwplan_index_check',
+                  help='Scratch database to seed, then drop. Its name must contain "index_check".')
+    def check_indexes_command(database):
+        """Fail if any registered query scans a collection or sorts in memory."""
+        try:
+            failures = check_indexes(app.mongo.cx, database)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if failures:
+            raise click.ClickException('Unindexed queries: {}'.format(', '.join(failures)))
 
     return app
@@ -0,0 +1,189 @@
+"""
+A read-only JSON API served by aiohttp and Motor, for the high fan-out read paths.
+
+It reuses the query builders in app.models and authenticates with the Flask session cookie, so it must be served where
+the browser sends that cookie: behind a reverse proxy that sends /api/read/ to it and everything else to the Flask app,
+or on a subdomain with SESSION_COOKIE_DOMAIN set to the parent domain. Heroku only routes to a web process, so there it
+runs as a separate app (see async_run.py and the README). Each worker interleaves many requests while they wait on
+Mongo instead of handling one at a time.
+"""
+from datetime import datetime, timedelta
+
+from aiohttp import web
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+from itsdangerous import BadSignature
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.models import Task, UserCalendar
+
+
+def _task_json(task):
+    return {
+        'id': str(task['_id']),
+        'class_id': str(task['class_id']),
+        'class_name': (task.get('class') or {}).get('name'),
+        'name': task.get('name'),
+        'description': task.get('description'),
+        'category': task.get('category'),
+        'date': task['date'].isoformat() if task.get('date') else None,
+        'archived': task.get('archived'),
+    }
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise web.HTTPBadRequest()
+
+
+class ReadAPI:
+    def __init__(self, config, db, session_serializer, session_max_age):
+        self.config = config
+        self.db = db
+        self.session_serializer = session_serializer
+        self.session_max_age = session_max_age
+
+    async def get_user(self, request):
+        """Return the logged in user's document, read from the Flask session cookie."""
+        cookie = request.cookies.get(self.config['SESSION_COOKIE_NAME'])
+        if not cookie:
+            raise web.HTTPUnauthorized()
+        try:
+            session = self.session_serializer.loads(cookie, max_age=self.session_max_age)
+        except BadSignature:
+            raise web.HTTPUnauthorized()
+        user = await self.db.users.find_one({'_id': session.get('user_id')}, ['class_ids', 'verified'])
+        if user is None or not user.get('verified'):
+            raise web.HTTPUnauthorized()
+        return user
+
+    async def get_viewable_class(self, user, class_id):
+        cls = await self.db.classes.find_one({'_id': class_id})
+        if cls is None:
+            raise web.HTTPNotFound()
+        if user['_id'] != cls['owner_id'] and user['_id'] not in set(cls.get('member_ids', [])):
+            raise web.HTTPForbidden()
+        return cls
+
+    async def get_unarchived_class_ids(self, user):
+        cursor = self.db.classes.find({'_id': {'$in': user['class_ids']}, 'archived': False}, ['_id'])
+        return [cls['_id'] for cls in await cursor.to_list(None)]
+
+    async def fill_class_summaries(self, tasks):
+        """Fill in missing or partial class summaries with one query, as Task.fill_class_summaries does."""
+        stale = [task for task in tasks if not Task.has_class_summary(task)]
+        if stale:
+            fields = list(Task.class_summary_fields)
+            cursor = self.db.classes.find({'_id': {'$in': list({task['class_id'] for task in stale})}}, fields)
+            summaries = {cls['_id']: {key: cls.get(key) for key in fields} for cls in await cursor.to_list(None)}
+            for task in stale:
+                task['class'] = summaries.get(task['class_id'])
+        return tasks
+
+    async def find_tasks(self, class_ids, limit, **kwargs):
+        query, sort = Task.build_query(class_ids, **kwargs)
+        cursor = self.db.tasks.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        tasks = await cursor.to_list(limit + 1)
+        page, more = await self.fill_class_summaries(tasks[:limit]), len(tasks) > limit
+        return {
+            'tasks': [_task_json(task) for task in page],
+            'next': Task.encode_cursor(page[-1].get('date'), page[-1]['_id']) if more else None,
+        }
+
+    async def tasks(self, request):
+        """The same page of tasks as the Flask /api/tasks, without the rendered cards."""
+        user = await self.get_user(request)
+        args = request.query
+        try:
+            limit = max(1, min(int(args.get('limit', self.config['TASK_PAGE_SIZE'])),
+                               self.config['TASK_PAGE_SIZE_MAX']))
+            start = datetime.strptime(args['start'], '%Y-%m-%d') if 'start' in args else datetime.min
+            end = datetime.strptime(args['end'], '%Y-%m-%d') if 'end' in args else datetime.max
+            after = Task.decode_cursor(args['cursor']) if 'cursor' in args else None
+        except ValueError:
+            raise web.HTTPBadRequest()
+        archived = args.get('archived', '').lower()
+        if 'class_id' in args:
+            class_ids = [(await self.get_viewable_class(user, _object_id(args['class_id'])))['_id']]
+        elif archived == 'false':
+            class_ids = await self.get_unarchived_class_ids(user)
+        else:
+            class_ids = user['class_ids']
+        page = await self.find_tasks(
+            class_ids, limit,
+            order=-1 if args.get('order') == '-1' else 1,
+            time_range=(start, end) if ('start' in args or 'end' in args) else None,
+            archived=archived != 'false',
+            unarchived=archived != 'true',
+            category=args.get('category'),
+            after=after,
+        )
+        return web.json_response(page)
+
+    async def calendar(self, request):
+        """The month view's tasks grouped by day offset from the first day shown and by class."""
+        user = await self.get_user(request)
+        try:
+            year, month = int(request.match_info['year']), int(request.match_info['month'])
+            grid = UserCalendar.build_grid(year, month)
+        except ValueError:
+            raise web.HTTPNotFound()
+        time_range = (
+            datetime.combine(grid[0][0]['date'], datetime.min.time()),
+            datetime.combine(grid[-1][-1]['date'], datetime.min.time()) + timedelta(days=1)
+        )
+        cursor = self.db.classes.find({'_id': {'$in': user['class_ids']}, 'archived': False}, ['name'])
+        class_names = {cls['_id']: cls.get('name') for cls in await cursor.to_list(None)}
+        pipeline = UserCalendar.build_pipeline(class_names, time_range)
+        groups = await self.db.tasks.aggregate(pipeline).to_list(None)
+        return web.json_response({
+            'start': grid[0][0]['date'].isoformat(),
+            'weeks': len(grid),
+            'groups': [{
+                'day': int(group['_id']['day']),
+                'class_id': str(group['_id']['class_id']),
+                'class_name': class_names.get(group['_id']['class_id']),
+                'tasks': [{'id': str(task['_id']), 'name': task.get('name')} for task in group['tasks']],
+            } for group in groups],
+        })
+
+    async def view_class(self, request):
+        """A class and the first page of its unarchived tasks."""
+        user = await self.get_user(request)
+        cls = await self.get_viewable_class(user, _object_id(request.match_info['class_id']))
+        page = await self.find_tasks([cls['_id']], self.config['TASK_PAGE_SIZE'], archived=False)
+        return web.json_response(dict(page, **{
+            'id': str(cls['_id']),
+            'name': cls.get('name'),
+            'description': cls.get('description'),
+            'archived': cls.get('archived'),
+            'editable': user['_id'] == cls['owner_id'],
+        }))
+
+
+def create_async_app():
+    # Load the configuration exactly like create_app, without setting up any of its extensions
+    flask_app = Flask('app', instance_relative_config=True)
+    flask_app.config.from_object('config')
+    flask_app.config.from_pyfile('application.cfg', silent=True)
+    config = flask_app.config
+
+    client = AsyncIOMotorClient(config['MONGO_URI'])
+    api = ReadAPI(
+        config,
+        client.get_default_database(),
+        SecureCookieSessionInterface().get_signing_serializer(flask_app),
+        int(flask_app.permanent_session_lifetime.total_seconds())
+    )
+
+    app = web.Application()
+    app.router.add_get('/api/read/tasks', api.tasks)
+    app.router.add_get('/api/read/calendar/{year}/{month}', api.calendar)
+    app.router.add_get('/api/read/classes/{class_id}', api.view_class)
+    return app
@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+import time
+
+from pymongo import ReplaceOne
+
+
+class LRUCache:
+    """
+    A thread-safe in-process cache that evicts the least recently used entries past maxsize.
+
+    If ttl is given, entries also expire that many seconds after they were set.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            expires, value = self._entries[key]
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_many(self, keys):
+        """Return a dict of the cached values of those keys that are present."""
+        missing = object()
+        values = {key: self.get(key, missing) for key in keys}
+        return {key: value for key, value in values.items() if value is not missing}
+
+    def set_many(self, items):
+        for key, value in items.items():
+            self.set(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class MongoCache:
+    """A cache shared by every worker process, stored in a Mongo collection with string keys."""
+
+    def __init__(self, get_collection):
+        self.get_collection = get_collection
+
+    def get(self, key, default=None):
+        document = self.get_collection().find_one({'_id': key})
+        if document is None:
+            return default
+        return document['value']
+
+    def set(self, key, value):
+        self.get_collection().replace_one(
+            {'_id': key},
+            {'value': value, 'created': datetime.utcnow()},
+            upsert=True
+        )
+
+    def get_many(self, keys):
+        """Return a dict of the cached values of those keys that are present, with a single query."""
+        return {document['_id']: document['value']
+                for document in self.get_collection().find({'_id': {'$in': list(keys)}})}
+
+    def set_many(self, items):
+        if items:
+            now = datetime.utcnow()
+            self.get_collection().bulk_write([
+                ReplaceOne({'_id': key}, {'value': value, 'created': now}, upsert=True) for key, value in items.items()
+            ], ordered=False)
+
+    def delete(self, key):
+        self.get_collection().delete_one({'_id': key})
+
+    def clear(self):
+        self.get_collection().delete_many({})
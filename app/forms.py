@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from flask_wtf import FlaskForm, RecaptchaField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, BooleanField, SelectField, TextAreaField
 from wtforms.validators import InputRequired, Length, EqualTo, Email, DataRequired, Regexp, Optional
 from wtforms_components import DateField, TimeField
@@ -56,6 +57,13 @@ class TaskForm(FlaskForm):
     category = SelectField('Category', [Optional()], choices=sorted((x, x.capitalize()) for x in Task.categories))
 
 
+class SyllabusForm(FlaskForm):
+    syllabus = FileField('Syllabus (CSV or iCalendar)', [
+        FileRequired('Please choose a file.'),
+        FileAllowed(['csv', 'ics'], 'Please upload a .csv or .ics file.')
+    ])
+
+
 class ChangePasswordForm(FlaskForm):
     current_password = PasswordField('Current Password', [InputRequired('Please enter your current password.')])
     new_password = PasswordField('New Password', [
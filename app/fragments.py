@@ -0,0 +1,57 @@
+from flask import current_app, g
+from flask_login import current_user
+from markupsafe import Markup
+
+
+def _cards():
+    """Return the cards.html macros, bound to the current user once per request."""
+    if 'cards' not in g:
+        template = current_app.jinja_env.get_template('cards.html')
+        g.cards = template.make_module({'current_user': current_user})
+    return g.cards
+
+
+def _cached(key, render):
+    html = current_app.fragment_cache.get(key)
+    if html is None:
+        html = str(render())
+        current_app.fragment_cache.set(key, html)
+    return Markup(html)
+
+
+def _cached_many(items, key, render):
+    """Return the fragments of several items, looking them all up in the cache at once and storing the misses."""
+    keys = [key(item) for item in items]
+    cached = current_app.fragment_cache.get_many(keys)
+    rendered = {}
+    for item_key, item in zip(keys, items):
+        if item_key not in cached and item_key not in rendered:
+            rendered[item_key] = str(render(item))
+    current_app.fragment_cache.set_many(rendered)
+    return [Markup(cached[item_key] if item_key in cached else rendered[item_key]) for item_key in keys]
+
+
+def _task_key(task, show_class):
+    return 'task:{}:{}:{:d}:{:d}'.format(task.get_id(), task.version, task.user_owns_class(current_user), show_class)
+
+
+def _class_key(cls):
+    return 'class:{}:{}'.format(cls.get_id(), cls.version)
+
+
+def task_card(task, show_class=False):
+    return _cached(_task_key(task, show_class), lambda: _cards().task_card(task, show_class=show_class))
+
+
+def task_cards(tasks, show_class=False):
+    """Render a list of task cards with one cache lookup, which matters when the cache is shared through Mongo."""
+    return _cached_many(list(tasks), lambda task: _task_key(task, show_class),
+                        lambda task: _cards().task_card(task, show_class=show_class))
+
+
+def class_card(cls):
+    return _cached(_class_key(cls), lambda: _cards().class_card(cls))
+
+
+def class_cards(classes):
+    return _cached_many(list(classes), _class_key, lambda cls: _cards().class_card(cls))
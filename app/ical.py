@@ -0,0 +1,98 @@
+"""Writing tasks as an iCalendar (RFC 5545) feed, and reading events back from one."""
+from datetime import datetime
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Fold a content line into chunks of at most 75 octets, continuing each one with a space."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    chunks = []
+    while encoded:
+        size = 75 if not chunks else 74
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:  # Don't split a multi-byte character
+            size -= 1
+        chunks.append(encoded[:size].decode('utf-8'))
+        encoded = encoded[size:]
+    return '\r\n '.join(chunks) + '\r\n'
+
+
+def format_event(task, class_name, stamp):
+    date = task.date
+    if date.time() == datetime.min.time():
+        start = 'DTSTART;VALUE=DATE:' + date.strftime('%Y%m%d')
+    else:
+        start = 'DTSTART:' + date.strftime('%Y%m%dT%H%M%S')  # Floating time, as entered by the user
+    lines = [
+        'BEGIN:VEVENT',
+        'UID:{}@hwplan'.format(task.get_id()),
+        'DTSTAMP:' + stamp,
+        start,
+        'SUMMARY:' + escape('{}: {}'.format(class_name, task.name)),
+    ]
+    if task.description:
+        lines.append('DESCRIPTION:' + escape(task.description))
+    if task.category:
+        lines.append('CATEGORIES:' + escape(task.category))
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+def generate_calendar(tasks, class_names, name='Homework Plan'):
+    """Yield a calendar one event at a time, so the whole feed never has to be held in memory."""
+    stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Homework Plan//EN', 'CALSCALE:GREGORIAN',
+        'X-WR-CALNAME:' + escape(name)
+    ))
+    for task in tasks:
+        yield format_event(task, class_names.get(task.class_id, ''), stamp)
+    yield 'END:VCALENDAR\r\n'
+
+
+def unescape(text):
+    replacements = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+    result = []
+    chars = iter(text)
+    for char in chars:
+        if char == '\\':
+            following = next(chars, '')
+            result.append(replacements.get(following, following))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def unfold(lines):
+    """Join folded content lines back together, reading the input lazily."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def read_events(lines):
+    """Yield each VEVENT of a calendar as a dict mapping property names to (parameters, raw value)."""
+    event = None
+    for line in unfold(lines):
+        name, _, value = line.partition(':')
+        name, *parameters = name.split(';')
+        name = name.upper()
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {}
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            yield event
+            event = None
+        elif event is not None:
+            event[name] = (parameters, value)
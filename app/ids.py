@@ -0,0 +1,42 @@
+import os
+from threading import Lock
+
+from pymongo import ReturnDocument
+
+
+class IdAllocator:
+    """
+    Hand out unique integer ids from a counter document, reserving a block of them per round trip (hi/lo).
+
+    Each process reserves block_size ids at a time with a single atomic $inc and hands them out locally, so concurrent
+    processes never contend on the counter for every id. A reservation is complete once the $inc returns, so a process
+    that crashes only leaves a gap in the sequence; ids are never reused. Blocks are per-process, so a forked worker
+    never hands out its parent's ids.
+    """
+
+    def __init__(self, get_collection, counter_id, block_size=20):
+        self.get_collection = get_collection
+        self.counter_id = counter_id
+        self.block_size = block_size
+        self._next = self._end = 0
+        self._pid = None
+        self._lock = Lock()
+
+    def _reserve(self):
+        counter = self.get_collection().find_one_and_update(
+            {'_id': self.counter_id},
+            {'$inc': {'seq': self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._end = counter['seq']
+        self._next = self._end - self.block_size
+        self._pid = os.getpid()
+
+    def next_id(self):
+        with self._lock:
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._reserve()
+            allocated = self._next
+            self._next += 1
+            return allocated
@@ -0,0 +1,219 @@
+"""
+The indexes every collection should have, and the queries they exist for.
+
+`flask sync-indexes` creates the registered indexes (and with --drop removes unregistered ones), and
+`flask check-indexes` seeds a scratch database, explains every registered query against it and fails if any of them
+scans a whole collection or sorts in memory. Register new indexes and queries here along with the code that needs
+them.
+"""
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import IndexModel, ASCENDING, TEXT
+
+from app.models import Task, UserCalendar
+
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email', unique=True),
+        IndexModel([('class_ids', ASCENDING)], name='class_ids'),
+    ],
+    'tasks': [
+        IndexModel([('class_id', ASCENDING), ('archived', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)],
+                   name='class_id_archived_date'),
+        IndexModel([('class_id', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)], name='class_id_date'),
+        # class_id is a suffix so the scoping to a user's classes is checked in the index, not on fetched documents
+        IndexModel([('name', TEXT), ('description', TEXT), ('class_id', ASCENDING)], name='text',
+                   weights={'name': 10, 'description': 1}),
+    ],
+    'classes': [
+        IndexModel([('name', TEXT), ('description', TEXT)], name='text', weights={'name': 10, 'description': 1}),
+    ],
+    'mail': [
+        IndexModel([('status', ASCENDING), ('next_attempt', ASCENDING)], name='status_next_attempt'),
+        # Only sent and failed messages have a finished date, so queued ones never expire
+        IndexModel([('finished', ASCENDING)], name='finished', expireAfterSeconds=7 * 86400),
+    ],
+    'fragments': [
+        IndexModel([('created', ASCENDING)], name='created', expireAfterSeconds=86400),
+    ],
+}
+
+
+def _feed(db, seed, order=1, after=False, **kwargs):
+    """Explain a page of the task feed as Task.find builds it."""
+    query, sort = Task.build_query(seed['class_ids'], order=order,
+                                   after=(seed['date'], seed['task_id']) if after else None, **kwargs)
+    return db.tasks.find(query).sort(sort).limit(21).explain()
+
+
+def _calendar(db, seed):
+    pipeline = UserCalendar.build_pipeline(seed['class_ids'], (seed['date'], seed['date'] + timedelta(days=42)))
+    return db.command('aggregate', 'tasks', pipeline=pipeline, explain=True)
+
+
+QUERIES = [
+    ('user by id', lambda db, seed: db.users.find({'_id': seed['user_id']}).explain()),
+    ('user by email', lambda db, seed: db.users.find({'email': seed['email']}).explain()),
+    ('users in class', lambda db, seed: db.users.find({'class_ids': seed['class_ids'][0]}).explain()),
+    ('classes of user', lambda db, seed: db.classes.find({'_id': {'$in': seed['class_ids']}, 'archived': False})
+     .explain()),
+    ('task feed', lambda db, seed: _feed(db, seed)),
+    ('unarchived task feed', lambda db, seed: _feed(db, seed, archived=False)),
+    ('archived task feed', lambda db, seed: _feed(db, seed, archived=True, unarchived=False, order=-1)),
+    ('task feed page', lambda db, seed: _feed(db, seed, archived=False, after=True)),
+    ('archived task feed page', lambda db, seed: _feed(db, seed, archived=True, unarchived=False, order=-1,
+                                                       after=True)),
+    ('tasks of class', lambda db, seed: _feed(db, dict(seed, class_ids=seed['class_ids'][:1]), archived=False)),
+    ('calendar month', _calendar),
+    ('task search', lambda db, seed: db.tasks.find({'$text': {'$search': 'task'},
+                                                    'class_id': {'$in': seed['class_ids']}}).explain()),
+    ('class search', lambda db, seed: db.classes.find({'$text': {'$search': 'class'},
+                                                       '_id': {'$in': seed['class_ids']}}).explain()),
+    ('due mail', lambda db, seed: db.mail.find({
+        '$or': [
+            {'status': 'queued', 'next_attempt': {'$lte': seed['date']}},
+            {'status': 'sending', 'claimed': {'$lt': seed['date']}}
+        ]
+    }).sort([('next_attempt', 1)]).limit(1).explain()),
+]
+
+
+def warm_indexes(db):
+    """Read from every registered index that exists once, pulling it into the server's cache."""
+    for collection_name, indexes in INDEXES.items():
+        existing = db[collection_name].index_information()
+        for index in indexes:
+            spec = index.document
+            if spec['name'] not in existing or TEXT in spec['key'].values():
+                continue  # Missing indexes are sync-indexes' job; text indexes can only be used by $text queries
+            list(db[collection_name].find({}, ['_id']).hint(spec['name']).limit(1))
+
+
+def _index_key(key):
+    """Return an index key the way index_information() reports it, with the text fields folded into _fts/_ftsx."""
+    fields = []
+    for field, direction in key:
+        if direction != TEXT:
+            fields.append((field, direction))
+        elif ('_fts', TEXT) not in fields:
+            fields += [('_fts', TEXT), ('_ftsx', 1)]
+    return fields
+
+
+INDEX_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression', 'weights')
+
+
+def _index_changed(spec, current):
+    """Return whether an existing index differs from its registered spec in its key or any option."""
+    if current['key'] != _index_key(spec['key'].items()):
+        return True
+    for option in INDEX_OPTIONS:
+        value = current.get(option)
+        if spec.get(option) != (dict(value) if isinstance(value, dict) else value):
+            return True
+    return False
+
+
+def sync_indexes(db, drop=False, log=print):
+    """Create every registered index, replacing any with the same name but a different key or options."""
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        existing = collection.index_information()
+        for index in indexes:
+            spec = index.document
+            current = existing.get(spec['name'])
+            if current is not None and _index_changed(spec, current):
+                log('Dropping changed index {}.{}'.format(collection_name, spec['name']))
+                collection.drop_index(spec['name'])
+        created = collection.create_indexes(indexes)
+        log('{}: {}'.format(collection_name, ', '.join(created)))
+        if drop:
+            registered = {index.document['name'] for index in indexes}
+            for name in existing:
+                if name != '_id_' and name not in registered:
+                    log('Dropping unregistered index {}.{}'.format(collection_name, name))
+                    collection.drop_index(name)
+
+
+def _seed(db):
+    """Fill a scratch database with enough documents for the query planner to prefer indexes."""
+    now = datetime.utcnow().replace(microsecond=0)
+    class_ids = [ObjectId() for _ in range(5)]
+    db.users.insert_many([{
+        '_id': i,
+        'email': 'user{}@example.com'.format(i),
+        'class_ids': class_ids[i % 5:] if i % 2 else class_ids[:i % 5],
+    } for i in range(200)])
+    db.classes.insert_many([{'_id': class_id, 'name': 'Class ' + str(class_id), 'archived': False}
+                            for class_id in class_ids])
+    tasks = [{
+        '_id': ObjectId(),
+        'name': 'Task {}'.format(i),
+        'class_id': class_ids[i % 5],
+        'archived': i % 3 == 0,
+        'date': now + timedelta(hours=i),
+    } for i in range(1000)]
+    db.tasks.insert_many(tasks)
+    db.mail.insert_many([{'status': 'sent', 'next_attempt': now - timedelta(minutes=i)} for i in range(200)])
+    return {
+        'user_id': 7,
+        'email': 'user7@example.com',
+        'class_ids': class_ids[:3],
+        'date': now,
+        'task_id': tasks[500]['_id'],
+    }
+
+
+SCRATCH_MARKER = 'index_check'
+
+
+def _winning_stages(explain):
+    """Yield the stage names of every winning plan in an explain result, ignoring rejected plans."""
+    if isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == 'winningPlan':
+                yield from _stages(value)
+            elif key != 'rejectedPlans':
+                yield from _winning_stages(value)
+    elif isinstance(explain, list):
+        for value in explain:
+            yield from _winning_stages(value)
+
+
+def _stages(plan):
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from _stages(value)
+
+
+def check_indexes(client, db_name, log=print):
+    """
+    Explain every registered query against a freshly seeded scratch database.
+
+    Returns the names of the queries whose plans contain a COLLSCAN or an in-memory SORT stage. The database is dropped
+    before and after, so its name must contain SCRATCH_MARKER.
+    """
+    if SCRATCH_MARKER not in db_name:
+        raise ValueError('Refusing to drop {!r}: scratch database names must contain {!r}.'.format(db_name,
+                                                                                                  SCRATCH_MARKER))
+    client.drop_database(db_name)
+    db = client[db_name]
+    try:
+        sync_indexes(db, log=lambda message: None)
+        seed = _seed(db)
+        failures = []
+        for name, explain in QUERIES:
+            winning = list(_winning_stages(explain(db, seed)))
+            bad = sorted({'COLLSCAN', 'SORT'} & set(winning))
+            log('{}: {}{}'.format(name, ' > '.join(winning), ' (FAILED)' if bad else ''))
+            if bad:
+                failures.append(name)
+        return failures
+    finally:
+        client.drop_database(db_name)
@@ -0,0 +1,25 @@
+from threading import Lock
+
+
+class LazyObject:
+    """
+    Stand in for an object that is only built, by calling factory, the first time one of its attributes is used.
+
+    This keeps extensions that are slow to import or construct out of create_app, and so out of every worker's cold
+    start, until a request actually needs them.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._object = None
+        self._lock = Lock()
+
+    def _get_object(self):
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._factory()
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self._get_object(), name)
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, UpdateOne
+
+
+class SendGridTransport:
+    """Deliver messages through the SendGrid HTTP API."""
+
+    def __init__(self, api_key, from_email):
+        self.api_key = api_key
+        self.from_email = from_email
+        self._client = None
+        self._pid = None
+
+    @property
+    def client(self):
+        """The API client, created on first use in each process so forked workers don't share one."""
+        if self._pid != os.getpid():
+            import sendgrid
+            self._client = sendgrid.SendGridAPIClient(apikey=self.api_key)
+            self._pid = os.getpid()
+        return self._client
+
+    def send(self, message):
+        data = {
+            "personalizations": [
+                {
+                    "to": [
+                        {
+                            "email": message['to_email']
+                        }
+                    ],
+                    "subject": message['subject']
+                }
+            ],
+            "from": {
+                "email": self.from_email
+            },
+            "content": [
+                {
+                    "type": "text/html",
+                    "value": message['content']
+                }
+            ]
+        }
+        response = self.client.client.mail.send.post(request_body=data)
+        if response.status_code >= 300:
+            raise RuntimeError('SendGrid responded with status {}'.format(response.status_code))
+
+
+class FakeTransport:
+    """Keep messages in memory instead of sending them, optionally simulating latency and failures."""
+
+    def __init__(self, latency=0.0, fail_every=0):
+        self.latency = latency
+        self.fail_every = fail_every
+        self.sent = []
+        self._attempts = 0
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._attempts += 1
+            if self.fail_every and self._attempts % self.fail_every == 0:
+                raise RuntimeError('Simulated delivery failure')
+            self.sent.append(message)
+
+
+class MailQueue:
+    """
+    An outbound mail queue persisted in the mail collection.
+
+    Messages are queued by requests and delivered by a pool of worker threads, started in each process on first use.
+    Workers claim messages in batches, retry failed deliveries with exponential backoff and record each message's
+    status ('queued', 'sending', 'sent' or 'failed'). A message claimed by a worker that died is claimed again once
+    its lease expires.
+    """
+
+    def __init__(self, app, transport):
+        self.app = app
+        self.transport = transport
+        self.workers = app.config['MAIL_WORKERS']
+        self.batch_size = app.config['MAIL_BATCH_SIZE']
+        self.max_attempts = app.config['MAIL_MAX_ATTEMPTS']
+        self.retry_delay = app.config['MAIL_RETRY_DELAY']
+        self.poll_interval = app.config['MAIL_POLL_INTERVAL']
+        self.lease = timedelta(seconds=app.config['MAIL_LEASE'])
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_collection(self):
+        return self.app.mongo.db.mail
+
+    def enqueue(self, subject, to_email, content):
+        now = datetime.utcnow()
+        result = self.get_collection().insert_one({
+            'subject': subject,
+            'to_email': to_email,
+            'content': content,
+            'status': 'queued',
+            'attempts': 0,
+            'created': now,
+            'next_attempt': now,
+        })
+        self.start()
+        self._wakeup.set()
+        return result.inserted_id
+
+    def get_status(self, message_id):
+        document = self.get_collection().find_one({'_id': message_id}, ['status'])
+        return document and document['status']
+
+    def start(self):
+        """Start the worker threads if they aren't running in this process yet."""
+        with self._lock:
+            if self._pid == os.getpid() or not self.workers:
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._pid = None
+
+    def _work(self):
+        with self.app.app_context():
+            while not self._stopping.is_set():
+                if not self.process_batch():
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+
+    def claim(self):
+        now = datetime.utcnow()
+        return self.get_collection().find_one_and_update(
+            {
+                '$or': [
+                    {'status': 'queued', 'next_attempt': {'$lte': now}},
+                    {'status': 'sending', 'claimed': {'$lt': now - self.lease}}
+                ]
+            },
+            {'$set': {'status': 'sending', 'claimed': now}},
+            sort=[('next_attempt', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def process_batch(self):
+        """Claim and deliver up to a batch of due messages, returning how many were claimed."""
+        messages = []
+        while len(messages) < self.batch_size:
+            message = self.claim()
+            if message is None:
+                break
+            messages.append(message)
+        if not messages:
+            return 0
+
+        updates = []
+        for message in messages:
+            attempts = message['attempts'] + 1
+            finished = True
+            try:
+                self.transport.send(message)
+            except Exception as e:
+                if attempts >= self.max_attempts:
+                    update = {'status': 'failed'}
+                else:
+                    delay = self.retry_delay * 2 ** (attempts - 1)
+                    update = {'status': 'queued', 'next_attempt': datetime.utcnow() + timedelta(seconds=delay)}
+                    finished = False
+                update.update({'attempts': attempts, 'last_error': str(e)})
+            else:
+                update = {'status': 'sent', 'attempts': attempts, 'sent_on': datetime.utcnow()}
+            if finished:
+                # The content holds confirmation and reset links, so it isn't kept once it can no longer be sent;
+                # the rest of the record expires through the finished TTL index
+                update['finished'] = datetime.utcnow()
+                updates.append(UpdateOne({'_id': message['_id']}, {'$set': update, '$unset': {'content': ''}}))
+            else:
+                updates.append(UpdateOne({'_id': message['_id']}, {'$set': update}))
+        self.get_collection().bulk_write(updates, ordered=False)
+        return len(messages)
+
+    def drain(self):
+        """Deliver every due message from the calling thread."""
+        with self.app.app_context():
+            while self.process_batch():
+                pass
@@ -0,0 +1,121 @@
+"""
+Per-request Mongo instrumentation and per-endpoint metrics in the Prometheus text format.
+
+A pymongo CommandListener attributes every command and its duration to the Flask request that issued it, and each
+request's latency, command count and Mongo time are recorded in per-endpoint histograms served on /metrics. The
+histograms are kept per process, so scrape every worker (or run a single one) to see the whole picture. Scrapers
+authenticate with METRICS_TOKEN as a bearer token; without one configured, /metrics isn't served at all.
+"""
+import hmac
+import time
+from bisect import bisect_left
+from threading import Lock
+
+from flask import g, has_request_context, request, Response, abort
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class RequestCommandListener(monitoring.CommandListener):
+    """Add each Mongo command issued while handling a request to that request's totals."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    @staticmethod
+    def _record(event):
+        if has_request_context() and 'mongo_commands' in g:
+            g.mongo_commands += 1
+            g.mongo_seconds += event.duration_micros / 1e6
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, endpoint, value):
+        counts, total = self._series.get(endpoint, ([0] * (len(self.buckets) + 1), 0))
+        counts[bisect_left(self.buckets, value)] += 1
+        self._series[endpoint] = (counts, total + value)
+
+    def render(self):
+        yield '# HELP {} {}'.format(self.name, self.description)
+        yield '# TYPE {} histogram'.format(self.name)
+        for endpoint, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield '{}_bucket{{endpoint="{}",le="{}"}} {}'.format(self.name, endpoint, bound, cumulative)
+            yield '{}_sum{{endpoint="{}"}} {}'.format(self.name, endpoint, total)
+            yield '{}_count{{endpoint="{}"}} {}'.format(self.name, endpoint, cumulative)
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = (
+            Histogram('hwplan_request_seconds', 'Request latency.', LATENCY_BUCKETS),
+            Histogram('hwplan_request_mongo_commands', 'Mongo commands issued per request.', COUNT_BUCKETS),
+            Histogram('hwplan_request_mongo_seconds', 'Time spent in Mongo commands per request.', LATENCY_BUCKETS),
+        )
+        self._lock = Lock()
+
+    def observe(self, endpoint, *values):
+        with self._lock:
+            for histogram, value in zip(self.histograms, values):
+                histogram.observe(endpoint, value)
+
+    def render(self):
+        with self._lock:
+            return '\n'.join(line for histogram in self.histograms for line in histogram.render()) + '\n'
+
+
+_listener = None
+
+
+def init_app(app):
+    """Instrument an app. This must run before the app creates its Mongo client."""
+    global _listener
+    if _listener is None:
+        _listener = RequestCommandListener()
+        monitoring.register(_listener)
+    app.metrics = Metrics()
+
+    @app.before_request
+    def start_request():
+        g.request_started = time.perf_counter()
+        g.mongo_commands = 0
+        g.mongo_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        app.metrics.observe(request.endpoint or 'unmatched', time.perf_counter() - g.request_started,
+                            g.mongo_commands, g.mongo_seconds)
+        if app.config['MONGO_DEBUG_HEADER']:
+            response.headers['X-Mongo-Commands'] = str(g.mongo_commands)
+            response.headers['X-Mongo-Time'] = '{:.6f}'.format(g.mongo_seconds)
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        """Serve the metrics to a scraper holding METRICS_TOKEN as a bearer token; 404 if no token is configured."""
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            abort(404)
+        # compare_digest only takes ASCII strings, so a non-ASCII header would raise rather than fail to match
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode('utf-8'),
+                                   ('Bearer ' + token).encode('utf-8')):
+            abort(401)
+        return Response(app.metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -1,18 +1,37 @@
 from datetime import datetime, date, time, timedelta
 from collections import defaultdict
-import flask_pymongo.wrappers
-from flask import current_app, abort
+from contextlib import contextmanager
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+from flask import current_app, abort, g
 from flask_login import current_user
 
+from app.read_models import TaskView, ClassView
+
+MS_PER_DAY = 24 * 60 * 60 * 1000
+EPOCH = datetime(1970, 1, 1)
+
 
 class MongoDocument:
     @staticmethod
-    def get_collection() -> flask_pymongo.wrappers.Collection:
+    def get_collection() -> Collection:
         pass
 
-    def __init__(self, _id):
+    def __init__(self, _id, document=None, projection=None):
         self._id = _id
         self._cache = dict()
+        self._pending = None
+        if document is not None:
+            self._cache['document'] = document
+            if projection is not None:
+                self._cache['projection'] = set(projection) | {'_id'}
+
+    @classmethod
+    def from_document(cls, document, projection=None, **kwargs):
+        """Create an instance from an already-fetched document, optionally limited to the projected fields."""
+        return cls(document['_id'], document=document, projection=projection, **kwargs)
 
     def __eq__(self, other):
         return self.get_id() == other.get_id()
@@ -20,6 +39,7 @@ class MongoDocument:
     def get_document(self, override_cache=False) -> dict:
         if override_cache or ('document' not in self._cache):
             self._cache['document'] = self.get_collection().find_one({'_id': self.get_id()})
+            self._cache.pop('projection', None)
         return self._cache['document']
 
     def update_cache(self):
@@ -34,6 +54,15 @@ class MongoDocument:
     def get_id(self):
         return self._id
 
+    @classmethod
+    def from_request(cls, _id):
+        """Return an instance shared by the rest of the request, so its document is fetched at most once."""
+        instances = g.setdefault('documents', {})
+        key = (cls.__name__, _id)
+        if key not in instances:
+            instances[key] = cls(_id)
+        return instances[key]
+
     def _replace_document(self, document):
         self.get_collection().replace_one(
             {'_id': self.get_id()},
@@ -41,20 +70,56 @@ class MongoDocument:
         )
 
     def mongo_get(self, key, default=None, override_cache=False):
+        if self._pending is not None and key in self._pending:
+            return self._pending[key]
         if not self.exists():
             return default
+        if key not in self._cache.get('projection', (key,)):
+            override_cache = True  # The field wasn't fetched along with the rest of the document
         return self.get_document(override_cache=override_cache).get(key, default)
 
-    def mongo_set(self, key, value):
-        self.get_collection().update_one(
+    def _update(self, update):
+        """
+        Apply an update and refresh the cache from the updated document in the same round trip.
+
+        Every update also bumps the document's version, which keys anything rendered from it, and sets its modification
+        date.
+        """
+        update = dict(update, **{
+            '$inc': dict(update.get('$inc', {}), version=1),
+            '$currentDate': dict(update.get('$currentDate', {}), modified=True)
+        })
+        self._cache['document'] = self.get_collection().find_one_and_update(
             {'_id': self.get_id()},
-            {
-                '$set': {
-                    key: value
-                }
-            }
+            update,
+            return_document=ReturnDocument.AFTER
         )
-        self.update_cache()
+        self._cache.pop('projection', None)
+
+    @contextmanager
+    def batch(self):
+        """Stage every mongo_set made inside the block and write them all with a single update."""
+        if self._pending is not None:
+            yield self
+            return
+        self._pending = {}
+        try:
+            yield self
+            pending = self._pending
+        finally:
+            self._pending = None
+        if pending:
+            self._update({'$set': pending})
+
+    def mongo_set(self, key, value):
+        if self._pending is not None:
+            self._pending[key] = value
+            return
+        self._update({
+            '$set': {
+                key: value
+            }
+        })
 
     def mongo_push(self, key, value, ignore_duplicates=True):
         if ignore_duplicates:
@@ -62,22 +127,15 @@ class MongoDocument:
             for elem in lst:
                 if elem == value:
                     return
-        self.get_collection().update_one(
-            {'_id': self.get_id()},
-            {
-                '$push': {
-                    key: value
-                }
+        self._update({
+            '$push': {
+                key: value
             }
-        )
-        self.update_cache()
-
-    def to_struct(self):
-        class Struct:
-            def __init__(self, **entries):
-                self.__dict__.update(entries)
+        })
 
-        return Struct(**self.get_document())
+    @property
+    def version(self):
+        return self.mongo_get('version', default=0)
 
 
 class ValidationMixin:
@@ -91,9 +149,9 @@ class ValidationMixin:
 
 
 class User(MongoDocument, ValidationMixin):
-    def __init__(self, _id: int, is_authenticated=False):
+    def __init__(self, _id: int, is_authenticated=False, **kwargs):
         self.is_authenticated = is_authenticated
-        super().__init__(_id)
+        super().__init__(_id, **kwargs)
 
     @staticmethod
     def get_collection():
@@ -113,9 +171,20 @@ class User(MongoDocument, ValidationMixin):
         # )
         document = current_app.mongo.db.users.find_one({'email': email.lower()})
         if document is not None:
-            return cls(document['_id'])
+            return cls.from_document(document)
         return User(None)
 
+    @classmethod
+    def from_session(cls, user_id):
+        """Load the authenticated user of a session, from the per-process user cache when possible."""
+        document = current_app.user_cache.get(user_id)
+        if document is None:
+            document = cls.get_collection().find_one({'_id': user_id})
+            if document is None:
+                return None
+            current_app.user_cache.set(user_id, document)
+        return cls.from_document(document, is_authenticated=True)
+
     @classmethod
     def from_login(cls, email, password):
         """Create and authenticate a user with a username and password."""
@@ -126,13 +195,13 @@ class User(MongoDocument, ValidationMixin):
 
     @staticmethod
     def hash_password(password):
-        return current_app.bcrypt.generate_password_hash(password)
+        return current_app.password_hasher.hash(password)
 
     @classmethod
     def create(cls, email, password):
         """Add a new user to the database."""
-        user_id = current_app.mongo.db.counters.find_one_and_update({'_id': 'user_id'}, {'$inc': {'seq': 1}})['seq']
-        password_hash = cls.hash_password()
+        user_id = current_app.user_ids.next_id()
+        password_hash = cls.hash_password(password)
         result = cls.get_collection().insert_one({'_id': user_id,
                                                   'email': email.lower(),
                                                   'password': password_hash,
@@ -156,13 +225,38 @@ class User(MongoDocument, ValidationMixin):
             return None
         return super().get_document(override_cache=override_cache)
 
+    def _update(self, update):
+        super()._update(dict(update, **{'$inc': dict(update.get('$inc', {}), data_version=1)}))
+        current_app.user_cache.delete(self.get_id())
+
+    def get_data_version(self):
+        """
+        Return the version of everything the user's pages show, read from the database rather than any cache.
+
+        It is bumped by every write to the user and to any of their classes or tasks. The whole document is read, and
+        if this instance was loaded from an older one (another worker's write leaves this worker's user cache stale), it
+        replaces that copy here and in the user cache, so a page tagged with the version is rendered from it too.
+        """
+        document = self.get_collection().find_one({'_id': self.get_id()})
+        if document is None:
+            return None
+        version = document.get('data_version', 0)
+        cached = self._cache.get('document') or {}
+        if cached.get('data_version', 0) != version or 'projection' in self._cache:
+            self._cache['document'] = document
+            self._cache.pop('projection', None)
+            if self.is_authenticated:
+                current_app.user_cache.set(self.get_id(), document)
+        return version
+
     def authenticate(self, password):
         """Authenticate the user by checking if the password hashes match."""
         if not self.exists():
             return
-        self.is_authenticated = current_app.bcrypt.check_password_hash(
-            self.mongo_get('password'),
-            password)
+        password_hash = self.mongo_get('password')
+        self.is_authenticated = current_app.password_hasher.check(password_hash, password)
+        if self.is_authenticated and current_app.password_hasher.needs_rehash(password_hash):
+            self.set_password(password)  # The configured cost factor changed since the password was set
         return self.is_authenticated
 
     @property
@@ -173,7 +267,8 @@ class User(MongoDocument, ValidationMixin):
         password_hash = self.hash_password(password)
         self.mongo_set('password', password_hash)
 
-    def get_classes(self, archived=True, unarchived=True):
+    def get_classes(self, archived=True, unarchived=True, projection=None, view=False):
+        """Yield the user's classes, or ClassViews of them if view is true."""
         if not self.exists():
             return
         query_dict = {
@@ -182,20 +277,23 @@ class User(MongoDocument, ValidationMixin):
             }
         }
         if not (archived and unarchived): query_dict['archived'] = archived
-        query = Class.get_collection().find(query_dict)
+        if view:
+            yield from map(ClassView.from_document, Class.get_collection().find(query_dict, ClassView.projection))
+            return
+        query = Class.get_collection().find(query_dict, projection)
         for class_document in query:
-            yield Class(class_document.get('_id'))
+            yield Class.from_document(class_document, projection)
 
-    def get_tasks(self, limit=None, order=1, time_range: (datetime, datetime) = None, archived=True, unarchived=True):
-        tasks = (task
-                 for cls in self.get_classes(archived=archived)
-                 for task in cls.get_tasks(order=0, time_range=time_range, archived=archived, unarchived=unarchived))
-        if limit:
-            tasks = (task for task, _ in zip(tasks, range(limit)))
-        if order:
-            tasks = sorted(tasks, key=lambda task: task.date, reverse=(order < 1))
-        for task in tasks:
-            yield task
+    def get_tasks(self, limit=None, order=1, time_range: (datetime, datetime) = None, archived=True, unarchived=True,
+                  projection=None, category=None, after=None, view=False):
+        if not self.exists():
+            return
+        if archived:
+            class_ids = self.mongo_get('class_ids')
+        else:
+            class_ids = [cls.get_id() for cls in self.get_classes(archived=False, projection=['_id'])]
+        yield from Task.find(class_ids, limit=limit, order=order, time_range=time_range, archived=archived,
+                             unarchived=unarchived, projection=projection, category=category, after=after, view=view)
 
     def create_class(self, name, *args, **kwargs):
         return Class.create(name, self, *args, **kwargs)
@@ -206,14 +304,33 @@ class User(MongoDocument, ValidationMixin):
             return True
         return False
 
+    def search(self, text, limit):
+        """
+        Return the documents of the user's classes and tasks matching a text search, best first, at most limit of each.
+
+        Results are cached under the user's data version, so any change to their classes or tasks sends the next
+        search to the database and the old entries age out of the cache.
+        """
+        document = self.get_collection().find_one({'_id': self.get_id()}, ['class_ids', 'data_version'])
+        if document is None:
+            return [], []
+        key = (self.get_id(), document.get('data_version', 0), text, limit)
+        results = current_app.search_cache.get(key)
+        if results is None:
+            class_ids = document.get('class_ids', [])
+            results = (Class.search(class_ids, text, limit), Task.search(class_ids, text, limit))
+            current_app.search_cache.set(key, results)
+        return results
+
     def leave_class(self, class_to_leave):
-        classes = self.mongo_get('class_ids')
-        for i, class_id in enumerate(classes):
-            if class_id == class_to_leave.get_id():
-                classes.pop(i)
-                self.mongo_set('class_ids', classes)
-                return True
-        return False
+        if class_to_leave.get_id() not in self.mongo_get('class_ids'):
+            return False
+        self._update({
+            '$pull': {
+                'class_ids': class_to_leave.get_id()
+            }
+        })
+        return True
 
     def leave_invisible_classes(self):
         for cls in self.get_classes(archived=True):
@@ -259,8 +376,12 @@ class Class(MongoDocument, ValidationMixin):
     def create_task(self, _name, *args, **kwargs):
         return Task.create(_name, self, *args, **kwargs)
 
+    def create_tasks(self, tasks, batch_size=500):
+        return Task.create_many(self, tasks, batch_size=batch_size)
+
     def add_student(self, student: User):
         self.mongo_push('member_ids', student.get_id(), ignore_duplicates=True)
+        g.pop('class_permissions', None)
         # print(self.mongo_get('member_ids'))
 
     @property
@@ -270,6 +391,7 @@ class Class(MongoDocument, ValidationMixin):
     @owner.setter
     def owner(self, value: User):
         self.mongo_set('owner_id', value.get_id())
+        g.pop('class_permissions', None)
 
     @property
     def name(self):
@@ -291,44 +413,86 @@ class Class(MongoDocument, ValidationMixin):
     def archived(self):
         return self.mongo_get('archived')
 
+    def get_summary(self):
+        """Return the fields of the class that are copied onto each of its tasks."""
+        return {key: self.mongo_get(key) for key in Task.class_summary_fields}
+
+    def _update(self, update):
+        super()._update(update)
+        if any(key in Task.class_summary_fields for key in update.get('$set', {})):
+            # The whole summary is rewritten, so tasks with a missing or partial one get every field
+            Task.get_collection().update_many(
+                {'class_id': self.get_id()},
+                {'$set': {'class': self.get_summary()}, '$inc': {'version': 1}, '$currentDate': {'modified': True}}
+            )
+        self.bump_data_versions()
+
+    def bump_data_versions(self):
+        """Bump the data version of every user with the class in their list."""
+        User.get_collection().update_many({'class_ids': self.get_id()}, {'$inc': {'data_version': 1}})
+
     def set_archived(self, archived, archive_tasks=True):
         if archived and archive_tasks:
-            for task in self.get_tasks(archived=False):
-                task.set_archived(True)
-        self.mongo_set('archived', archived)
-
-    def get_tasks(self, limit=None, order=1, time_range: (datetime, datetime) = None, archived=True, unarchived=True):
-        query_dict = {
-            'class_id': self.get_id()
-        }
-        if not (archived and unarchived):
-            query_dict['archived'] = archived
-        if time_range is not None:
-            query_dict['date'] = {
-                '$gte': time_range[0],
-                '$lt': time_range[1]
+            Task.get_collection().update_many(
+                {'class_id': self.get_id(), 'archived': False},
+                {'$set': {'archived': True}, '$inc': {'version': 1}, '$currentDate': {'modified': True}}
+            )
+        self._update({
+            '$set': {
+                'archived': archived
+            },
+            '$inc': {
+                'task_version': 1
+            },
+            '$currentDate': {
+                'tasks_modified': True
             }
-        query = Task.get_collection().find(query_dict)
-        if order:
-            query = query.sort('date', order)
-        if limit:
-            query = query.limit(limit)
-        for task_document in query:
-            yield Task(task_document.get('_id'))
+        })
+
+    def touch(self):
+        """Mark the class's tasks as changed, invalidating anything cached from them."""
+        self.get_collection().update_one(
+            {'_id': self.get_id()},
+            {'$inc': {'task_version': 1}, '$currentDate': {'tasks_modified': True}}
+        )
+        self.bump_data_versions()
+
+    @classmethod
+    def touch_many(cls, class_ids):
+        """touch() several classes with one write to the classes and one to their users."""
+        cls.get_collection().update_many(
+            {'_id': {'$in': list(class_ids)}},
+            {'$inc': {'task_version': 1}, '$currentDate': {'tasks_modified': True}}
+        )
+        User.get_collection().update_many({'class_ids': {'$in': list(class_ids)}}, {'$inc': {'data_version': 1}})
+
+    @classmethod
+    def search(cls, class_ids, text, limit):
+        """Return the documents of the given classes matching a text search, best matches first."""
+        return list(cls.get_collection().find(
+            {'$text': {'$search': text}, '_id': {'$in': list(class_ids)}},
+            {'score': {'$meta': 'textScore'}}
+        ).sort([('score', {'$meta': 'textScore'}), ('_id', 1)]).limit(limit))
+
+    def get_tasks(self, limit=None, order=1, time_range: (datetime, datetime) = None, archived=True, unarchived=True,
+                  projection=None, category=None, after=None, view=False):
+        yield from Task.find([self.get_id()], limit=limit, order=order, time_range=time_range, archived=archived,
+                             unarchived=unarchived, projection=projection, category=category, after=after, view=view)
 
     def delete(self):
-        for task in self.get_tasks():
-            task.delete()
-        for student in self.get_members():
-            student.leave_class(self)
-        super().delete()
+        Task.get_collection().delete_many({'class_id': self.get_id()})
+        User.get_collection().update_many(
+            {'class_ids': self.get_id()},
+            {'$pull': {'class_ids': self.get_id()}, '$inc': {'version': 1, 'data_version': 1},
+             '$currentDate': {'modified': True}}
+        )
+        g.pop('class_permissions', None)
+        return super().delete()
 
     def user_can_edit(self, user: User = None):
-        if not self.exists():
-            return False
         if user is None:
             user = current_user
-        return self.exists() and user == self.owner
+        return self.get_permissions(user)[1]
 
     def get_members(self):
         if not self.exists():
@@ -337,19 +501,34 @@ class Class(MongoDocument, ValidationMixin):
         for student_id in self.mongo_get('member_ids', default=[]):
             yield User(student_id)
 
-    def user_can_view(self, user: User = None):
+    def get_member_ids(self):
+        """Return the ids of the owner and every student as a set."""
         if not self.exists():
-            return False
+            return set()
+        return {self.mongo_get('owner_id')} | set(self.mongo_get('member_ids', default=[]))
+
+    def get_permissions(self, user: User):
+        """Return whether a user can view and edit the class, memoized for the rest of the request."""
+        permissions = g.setdefault('class_permissions', {})
+        key = (user.get_id(), self.get_id())
+        if key not in permissions:
+            if not self.exists():
+                permissions[key] = (False, False)
+            else:
+                is_owner = user.get_id() == self.mongo_get('owner_id')
+                permissions[key] = (is_owner or user.get_id() in self.get_member_ids(), is_owner)
+        return permissions[key]
+
+    def user_can_view(self, user: User = None):
         if user is None:
             user = current_user
-        for member in self.get_members():
-            if user == member:
-                return True
-        return False
+        return self.get_permissions(user)[0]
 
 
 class Task(MongoDocument, ValidationMixin):
     categories = {'Homework', 'Exam', 'Quiz', 'Test', 'Project', 'Presentation', 'Classwork'}
+    bulk_actions = ('archive', 'unarchive', 'delete')
+    class_summary_fields = ('name', 'owner_id')
 
     @staticmethod
     def get_collection():
@@ -357,32 +536,190 @@ class Task(MongoDocument, ValidationMixin):
 
     @classmethod
     def create(cls, name, class_: Class, date: datetime = None, category=None, description=None):
-        result = cls.get_collection().insert_one({
+        result = cls.get_collection().insert_one(cls._new_document(name, class_, date, category, description))
+        class_.touch()
+        return cls(result.inserted_id)
+
+    @classmethod
+    def create_many(cls, class_: Class, tasks, batch_size=500):
+        """
+        Add tasks to a class from an iterable of (name, date, category, description) tuples with insert_many batches.
+
+        The iterable is consumed lazily, so it can stream from a parser. Returns how many tasks were created.
+        """
+        summary = class_.get_summary()
+        created = 0
+        batch = []
+        for name, date, category, description in tasks:
+            batch.append(cls._new_document(name, class_, date, category, description, summary=summary))
+            if len(batch) >= batch_size:
+                created += len(cls.get_collection().insert_many(batch).inserted_ids)
+                batch = []
+        if batch:
+            created += len(cls.get_collection().insert_many(batch).inserted_ids)
+        if created:
+            class_.touch()
+        return created
+
+    @staticmethod
+    def _new_document(name, class_: Class, date, category, description, summary=None):
+        return {
             'name': name,
             'class_id': class_.get_id(),
+            'class': summary or class_.get_summary(),
             'archived': False,
             'description': description,
             'date': date,
             'category': category,
             'date_created': datetime.utcnow(),
-        })
-        return cls(result.inserted_id)
+        }
 
-    def to_struct(self):
-        obj = super().to_struct()
-        dt = self.date
-        if dt.time() != datetime.min.time():
-            obj.__dict__.update({'time': self.date.time()})
-        return obj
+    @classmethod
+    def search(cls, class_ids, text, limit):
+        """Return the documents of the classes' tasks matching a text search, best matches first."""
+        return cls.fill_class_summaries(list(cls.get_collection().find(
+            {'$text': {'$search': text}, 'class_id': {'$in': list(class_ids)}},
+            {'score': {'$meta': 'textScore'}}
+        ).sort([('score', {'$meta': 'textScore'}), ('_id', 1)]).limit(limit)))
+
+    @classmethod
+    def fill_class_summaries(cls, documents):
+        """
+        Fill in the class summary of any task documents missing it or one of its fields, with one query for all of them.
+
+        Read models have no model to fall back on, unlike Task.class_name and Task.user_owns_class.
+        """
+        stale = [document for document in documents if not cls.has_class_summary(document)]
+        class_ids = {document['class_id'] for document in stale}
+        if class_ids:
+            summaries = {
+                class_document['_id']: {key: class_document.get(key) for key in cls.class_summary_fields}
+                for class_document in Class.get_collection().find({'_id': {'$in': list(class_ids)}},
+                                                                  list(cls.class_summary_fields))
+            }
+            for document in stale:
+                document['class'] = summaries.get(document['class_id'])
+        return documents
+
+    @classmethod
+    def has_class_summary(cls, document):
+        """Return whether a task document carries every field of the class summary."""
+        summary = document.get('class')
+        return bool(summary) and all(key in summary for key in cls.class_summary_fields)
+
+    @classmethod
+    def find(cls, class_ids, limit=None, order=1, time_range: (datetime, datetime) = None, archived=True,
+             unarchived=True, projection=None, category=None, after=None, view=False):
+        """
+        Find the tasks of several classes with a single query, sorted and limited by the database.
+
+        after is a (date, _id) keyset cursor: only tasks sorting after it in the requested order are returned. If view
+        is true, TaskViews are yielded instead of Tasks and projection is ignored.
+        """
+        query_dict, sort = cls.build_query(class_ids, order=order, time_range=time_range, archived=archived,
+                                           unarchived=unarchived, category=category, after=after)
+        query = cls.get_collection().find(query_dict, TaskView.projection if view else projection)
+        if sort:
+            query = query.sort(sort)
+        if limit:
+            query = query.limit(limit)
+        if view:
+            yield from map(TaskView.from_document, cls.fill_class_summaries(list(query)))
+            return
+        for task_document in query:
+            yield cls.from_document(task_document, projection)
+
+    @classmethod
+    def build_query(cls, class_ids, order=1, time_range: (datetime, datetime) = None, archived=True, unarchived=True,
+                    category=None, after=None):
+        """Return the filter and sort of a find query, so they can be issued by other drivers too."""
+        query_dict = {
+            'class_id': {
+                '$in': list(class_ids)
+            }
+        }
+        if not (archived and unarchived):
+            query_dict['archived'] = archived
+        if time_range is not None:
+            query_dict['date'] = {
+                '$gte': time_range[0],
+                '$lt': time_range[1]
+            }
+        if category is not None:
+            query_dict['category'] = category
+        if after is not None:
+            query_dict['$or'] = cls._keyset_after(after, order or 1)
+        sort = [('date', order), ('_id', order)] if order else None
+        return query_dict, sort
+
+    @classmethod
+    def repair_class_summaries(cls):
+        """Rewrite every task's class summary that no longer matches its class, returning how many were fixed."""
+        repaired = 0
+        for class_document in Class.get_collection().find({}, list(cls.class_summary_fields)):
+            summary = {key: class_document.get(key) for key in cls.class_summary_fields}
+            result = cls.get_collection().update_many(
+                {'class_id': class_document['_id'], 'class': {'$ne': summary}},
+                {'$set': {'class': summary}, '$inc': {'version': 1}, '$currentDate': {'modified': True}}
+            )
+            repaired += result.modified_count
+        return repaired
+
+    @staticmethod
+    def encode_cursor(date, _id):
+        """Encode a (date, _id) keyset position as an opaque string."""
+        date_part = 'null' if date is None else str((date - EPOCH) // timedelta(milliseconds=1))
+        return '{}.{}'.format(date_part, _id)
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor made by encode_cursor, raising ValueError if it is malformed."""
+        try:
+            date_part, id_part = cursor.split('.')
+            date = None if date_part == 'null' else EPOCH + timedelta(milliseconds=int(date_part))
+            return date, ObjectId(id_part)
+        except (InvalidId, OverflowError, TypeError) as e:
+            # OverflowError: a date outside what datetime can hold
+            raise ValueError(str(e))
+
+    @staticmethod
+    def _keyset_after(after, order):
+        """Return the clauses matching tasks that sort after a (date, _id) cursor. Missing dates sort first."""
+        after_date, after_id = after
+        op = '$gt' if order > 0 else '$lt'
+        if after_date is None:
+            clauses = [{'date': None, '_id': {op: after_id}}]
+            if order > 0:
+                clauses.append({'date': {'$ne': None}})
+        else:
+            clauses = [{'date': {op: after_date}}, {'date': after_date, '_id': {op: after_id}}]
+            if order < 0:
+                clauses.append({'date': None})
+        return clauses
 
     @property
     def class_(self):
-        return Class(self.mongo_get('class_id'))
+        return Class.from_request(self.mongo_get('class_id'))
 
     @property
     def owner(self):
         return self.class_.owner
 
+    @property
+    def class_name(self):
+        summary = self.mongo_get('class') or {}
+        return summary['name'] if 'name' in summary else self.class_.name
+
+    def user_owns_class(self, user):
+        """
+        Return whether a user owns the task's class according to the task's copy of the class summary.
+
+        This is cheap enough for rendering lists, but use user_can_edit to authorize changes.
+        """
+        summary = self.mongo_get('class') or {}
+        owner_id = summary['owner_id'] if 'owner_id' in summary else self.class_.mongo_get('owner_id')
+        return owner_id is not None and user.get_id() == owner_id
+
     @property
     def name(self):
         return self.mongo_get('name')
@@ -426,11 +763,52 @@ class Task(MongoDocument, ValidationMixin):
     def set_archived(self, archived):
         self.mongo_set('archived', archived)
 
+    def _update(self, update):
+        super()._update(update)
+        self.class_.touch()
+
+    def delete(self):
+        class_ = self.class_
+        result = super().delete()
+        class_.touch()
+        return result
+
+    @classmethod
+    def bulk(cls, user: User, task_ids, action):
+        """
+        Archive, unarchive or delete many tasks with one write, returning {task id: result}.
+
+        The tasks' classes are resolved with one query and the ones the user owns with one more, so permissions are
+        checked as a set instead of per task. A result is 'ok', 'forbidden' if the user cannot edit the task, or
+        'not_found'.
+        """
+        class_ids = {task['_id']: task['class_id']
+                     for task in cls.get_collection().find({'_id': {'$in': list(task_ids)}}, ['class_id'])}
+        owned = set()
+        if class_ids:
+            owned = {cls_['_id'] for cls_ in Class.get_collection().find(
+                {'_id': {'$in': list(set(class_ids.values()))}, 'owner_id': user.get_id()}, ['_id'])}
+        allowed = [task_id for task_id, class_id in class_ids.items() if class_id in owned]
+        if allowed:
+            if action == 'delete':
+                cls.get_collection().delete_many({'_id': {'$in': allowed}})
+            else:
+                archived = action == 'archive'
+                cls.get_collection().update_many(
+                    {'_id': {'$in': allowed}, 'archived': {'$ne': archived}},
+                    {'$set': {'archived': archived}, '$inc': {'version': 1}, '$currentDate': {'modified': True}}
+                )
+            Class.touch_many({class_ids[task_id] for task_id in allowed})
+        return {
+            task_id: 'not_found' if task_id not in class_ids else 'ok' if class_ids[task_id] in owned else 'forbidden'
+            for task_id in task_ids
+        }
+
     def user_can_edit(self, user):
-        return self.class_.user_can_edit(user)
+        return self.class_.get_permissions(user)[1]
 
     def user_can_view(self, user):
-        return self.class_.user_can_view(user)
+        return self.class_.get_permissions(user)[0]
 
 
 class UserCalendar:
@@ -439,7 +817,22 @@ class UserCalendar:
         self.month = month
         self.user = user
 
-        month_start = date(self.year, self.month, 1)
+        calendar = self.build_grid(year, month)
+        self.calendar = calendar
+        cal_start = calendar[0][0]['date']
+        time_range = (
+            datetime.combine(cal_start, datetime.min.time()),
+            datetime.combine(calendar[-1][-1]['date'], datetime.min.time()) + timedelta(days=1)
+        )
+        for day, class_id, class_name, tasks in self.get_groups(user, time_range):
+            for task_document in tasks:
+                task = Task.from_document(task_document, projection=['name'])
+                calendar[day // 7][day % 7]['tasks'][(class_id, class_name)].append(task)
+
+    @staticmethod
+    def build_grid(year, month):
+        """Return the weeks shown for a month as rows of seven {'date', 'tasks'} days, starting on a Sunday."""
+        month_start = date(year, month, 1)
         cal_start = month_start - timedelta(days=(month_start.weekday() + 1) % 7)
         row_start = date(cal_start.year, cal_start.month, cal_start.day)
         calendar = []
@@ -451,20 +844,52 @@ class UserCalendar:
                 day += timedelta(days=1)
             row_start = date(day.year, day.month, day.day)
             calendar.append(row)
-        self.calendar = calendar
+        return calendar
 
-        tasks = list(user.get_tasks(order=0, archived=False, time_range=(
-            datetime.combine(cal_start, datetime.min.time()),
-            datetime.combine(calendar[-1][-1]['date'], datetime.min.time()) + timedelta(days=1)
+    @staticmethod
+    def build_pipeline(class_ids, time_range: (datetime, datetime)):
+        """Return the aggregation grouping unarchived tasks in a time range by day offset and class."""
+        return [
+            {'$match': {
+                'class_id': {'$in': list(class_ids)},
+                'archived': False,
+                'date': {'$gte': time_range[0], '$lt': time_range[1]}
+            }},
+            {'$sort': {'date': 1, '_id': 1}},
+            {'$group': {
+                '_id': {
+                    'day': {'$floor': {'$divide': [{'$subtract': ['$date', time_range[0]]}, MS_PER_DAY]}},
+                    'class_id': '$class_id'
+                },
+                'first': {'$first': '$date'},
+                'tasks': {'$push': {'_id': '$_id', 'name': '$name'}}
+            }},
+            {'$sort': {'_id.day': 1, 'first': 1}}
+        ]
+
+    @staticmethod
+    def get_groups(user, time_range: (datetime, datetime)):
+        """
+        Return the user's unarchived tasks in a time range as (day offset, class id, class name, tasks) groups.
+
+        The groups come from one aggregation and are cached per user and range. The cache key includes every class's
+        name and task_version, so any change to a class or its tasks makes the next lookup miss.
+        """
+        classes = {cls.get_id(): cls for cls in user.get_classes(archived=False, projection=['name', 'task_version'])}
+        key = (user.get_id(), time_range, tuple(sorted(
+            (class_id, cls.mongo_get('name'), cls.mongo_get('task_version', default=0))
+            for class_id, cls in classes.items()
         )))
-        classes = {}
-        for task in tasks:
-            days = (task.date.date() - cal_start).days
-            class_id = task.class_id
-            if class_id not in classes:
-                classes[class_id] = Class(class_id)
-            cls = classes[class_id]
-            calendar[days // 7][days % 7]['tasks'][(class_id, cls.name)].append(task)
+        groups = current_app.calendar_cache.get(key)
+        if groups is None:
+            pipeline = UserCalendar.build_pipeline(classes, time_range)
+            groups = [
+                (int(group['_id']['day']), group['_id']['class_id'],
+                 classes[group['_id']['class_id']].mongo_get('name'), group['tasks'])
+                for group in Task.get_collection().aggregate(pipeline)
+            ]
+            current_app.calendar_cache.set(key, groups)
+        return groups
 
     def rows(self):
         for row in self.calendar:
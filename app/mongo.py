@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+
+from pymongo import MongoClient, uri_parser
+
+from app.indexes import warm_indexes
+
+
+class LazyMongo:
+    """
+    The app's Mongo client, with the .cx and .db attributes Flask-PyMongo had, created on first use in each process.
+
+    A client created before gunicorn forks its workers (with --preload, say) would share sockets and monitoring threads
+    with every worker. Instead each process builds its own pool, sized and timed out by the MONGO_* settings.
+    """
+
+    def __init__(self, app=None):
+        self._client = None
+        self._db = None
+        self._pid = None
+        self._lock = Lock()
+        self._warming = None
+        self.warm = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.uri = config['MONGO_URI'] or 'mongodb://localhost:27017/'
+        self.db_name = uri_parser.parse_uri(self.uri)['database'] or config.get('MONGO_DBNAME', app.name)
+        options = {
+            'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+            'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+            'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+            'socketTimeoutMS': config['MONGO_SOCKET_TIMEOUT_MS'],
+            'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        }
+        self.options = {name: value for name, value in options.items() if value is not None}
+        self.warmup_connections = config['MONGO_WARMUP_CONNECTIONS']
+
+    def _connect(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._client = MongoClient(self.uri, connect=False, **self.options)
+                self._db = self._client[self.db_name]
+                self._pid = os.getpid()
+                self.warm = False
+
+    @property
+    def cx(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        if self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    def warm_up(self):
+        """Open connections to the server and read the registered indexes, so the first requests don't wait on it."""
+        with ThreadPoolExecutor(self.warmup_connections) as executor:
+            list(executor.map(lambda _: self.cx.admin.command('ping'), range(self.warmup_connections)))
+        warm_indexes(self.db)
+        self.warm = True
+
+    def start_warm_up(self, on_error=None):
+        """
+        Warm up in a background thread, unless this process is already warm or warming up.
+
+        on_error is called with the exception if the warmup fails, and a later call starts another attempt.
+        """
+        def warm_up():
+            try:
+                self.warm_up()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+
+        with self._lock:
+            if self.warm or (self._warming is not None and self._warming.is_alive()):
+                return
+            self._warming = Thread(target=warm_up, daemon=True)
+            self._warming.start()
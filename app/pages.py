@@ -1,17 +1,92 @@
+import codecs
+import hashlib
 from datetime import datetime
+from functools import wraps
 
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
-from flask import Blueprint, redirect, url_for, render_template, jsonify, flash, current_app, abort
-from flask_login import login_user, login_required, logout_user, current_user, fresh_login_required
+from flask import Blueprint, redirect, url_for, render_template, jsonify, flash, current_app, abort, request, \
+    Response, stream_with_context, make_response, session
+from flask_login import login_user, login_required, logout_user, current_user, fresh_login_required, login_fresh
+from itsdangerous import BadSignature
+from pymongo.errors import PyMongoError
+from werkzeug.http import is_resource_modified
 
 import app
+from app import fragments, ical, syllabus
 from app.forms import RegistrationForm, LoginForm, ClassForm, TaskForm, ChangePasswordForm, ForgotPasswordForm, \
-    ResetPasswordForm
+    ResetPasswordForm, SyllabusForm
 from app.models import User, Class, Task, UserCalendar
+from app.passwords import PasswordHasherBusy
+from app.read_models import TaskView, ClassView
 
 pages = Blueprint('pages', __name__)
 
 
+def encode_cursor(task):
+    return Task.encode_cursor(task.date, task.get_id())
+
+
+def decode_cursor(cursor):
+    try:
+        return Task.decode_cursor(cursor)
+    except ValueError:
+        abort(400)
+
+
+def paginate(tasks, limit):
+    """Split limit + 1 fetched tasks into a page and the cursor of the next page, if there is one."""
+    tasks = list(tasks)
+    if len(tasks) <= limit:
+        return tasks, None
+    tasks = tasks[:limit]
+    return tasks, encode_cursor(tasks[-1])
+
+
+def user_data_etag(view):
+    """
+    Answer conditional GETs for a page that only shows the current user's data with a 304 while it is unchanged.
+
+    Revalidating costs one read of the user's data version; the view only runs when the ETag doesn't match.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if session.get('_flashes'):
+            return view(*args, **kwargs)  # Flashed messages are part of the page
+        etag = '{}-{}-{}-{}'.format(current_user.get_id(), current_user.get_data_version(),
+                                    datetime.today().date().isoformat(), current_app.config['DEPLOY_VERSION'])
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+
+@pages.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return 'The server is busy. Please try again in a moment.', 503, {'Retry-After': '5'}
+
+
+@pages.route('/healthz')
+def healthz():
+    """Readiness check: 503 until this worker's Mongo connections are warm, or while Mongo can't be reached."""
+    mongo = current_app.mongo
+    if not mongo.warm:
+        # A worker not started by gunicorn's post_fork hook, or whose warmup there failed
+        logger = current_app.logger
+        mongo.start_warm_up(on_error=lambda e: logger.error('Mongo warmup failed: %s', e))
+        return jsonify(status='warming'), 503
+    try:
+        mongo.cx.admin.command('ping')
+    except PyMongoError:
+        return jsonify(status='unavailable'), 503
+    return jsonify(status='ok')
+
+
 @pages.route('/')
 def index():
     if current_user.is_authenticated:
@@ -88,8 +163,11 @@ def logout():
 
 @pages.route('/home')
 @login_required
+@user_data_etag
 def home():
-    return render_template('home.html')
+    limit = current_app.config['TASK_PAGE_SIZE']
+    tasks, cursor = paginate(current_user.get_tasks(archived=False, limit=limit + 1, view=True), limit)
+    return render_template('home.html', tasks=tasks, cursor=cursor)
 
 
 @pages.route('/class/new', methods=('GET', 'POST'))
@@ -117,10 +195,11 @@ def view_class(class_id):
 def edit_class(class_id):
     cls = Class(ObjectId(class_id))
     cls.flask_validate(edit=True)
-    form = ClassForm(obj=cls.to_struct())
+    form = ClassForm(obj=ClassView.from_document(cls.get_document()))
     if form.validate_on_submit():
-        cls.name = form.name.data
-        cls.description = form.description.data
+        with cls.batch():
+            cls.name = form.name.data
+            cls.description = form.description.data
         return redirect(url_for('pages.view_class', class_id=str(cls.get_id())))
     return render_template('edit_class.html', form=form, cls=cls)
 
@@ -176,21 +255,41 @@ def new_task(class_id):
     return render_template('new_task.html', form=form)
 
 
+@pages.route('/class/import/<string:class_id>', methods=('GET', 'POST'))
+@login_required
+def import_tasks(class_id):
+    form = SyllabusForm()
+    cls = Class(ObjectId(class_id))
+    cls.flask_validate(edit=True)
+    errors = []
+    if form.validate_on_submit():
+        upload = form.syllabus.data
+        # Rows are parsed, validated and inserted as the upload is read instead of being loaded all at once
+        lines = codecs.getreader('utf-8-sig')(upload.stream, errors='replace')
+        created, errors = syllabus.import_tasks(cls, lines, upload.filename, current_app.config['IMPORT_MAX_ROWS'],
+                                                current_app.config['IMPORT_BATCH_SIZE'])
+        flash('Imported {} task{}.'.format(created, '' if created == 1 else 's'))
+        if not errors:
+            return redirect(url_for('pages.view_class', class_id=class_id))
+    return render_template('import_tasks.html', form=form, cls=cls, errors=errors)
+
+
 @pages.route('/task/edit/<string:task_id>', methods=('GET', 'POST'))
 @login_required
 def edit_task(task_id):
     task = Task(ObjectId(task_id))
     task.flask_validate(edit=True)
-    form = TaskForm(obj=task.to_struct())
+    form = TaskForm(obj=TaskView.from_document(task.get_document()))
     form.time.data = task.date.time()
     if form.validate_on_submit():
         date = form.date.data
         time = form.time.data
         dt = datetime.combine(date, time or datetime.min.time()) if date else None
-        task.name = form.name.data
-        task.description = form.description.data
-        task.category = form.category.data
-        task.date = dt
+        with task.batch():
+            task.name = form.name.data
+            task.description = form.description.data
+            task.category = form.category.data
+            task.date = dt
         return redirect(url_for('pages.view_class', class_id=str(task.class_.get_id())))
     return render_template('edit_task.html', form=form, task=task)
 
@@ -222,15 +321,111 @@ def delete_task(task_id):
     return jsonify(True)
 
 
+@pages.route('/task/bulk', methods=('POST',))
+@login_required
+def bulk_tasks():
+    """Archive, unarchive or delete many tasks, given a JSON body like {"action": "archive", "ids": [...]}."""
+    data = request.get_json(silent=True) or {}
+    action, ids = data.get('action'), data.get('ids')
+    if action not in Task.bulk_actions or not isinstance(ids, list) or len(ids) > current_app.config['TASK_BULK_MAX']:
+        abort(400)
+    if action == 'delete' and not login_fresh():
+        return current_app.login_manager.needs_refresh()
+    task_ids = {}
+    for task_id in ids:
+        try:
+            task_ids[str(task_id)] = ObjectId(task_id)
+        except (InvalidId, TypeError):
+            task_ids[str(task_id)] = None
+    results = Task.bulk(current_user, {task_id for task_id in task_ids.values() if task_id}, action)
+    return jsonify(results={key: results[task_id] if task_id else 'not_found' for key, task_id in task_ids.items()})
+
+
+@pages.route('/search')
+@login_required
+def search():
+    text = ' '.join(request.args.get('q', '').lower().split())[:200]
+    page = max(request.args.get('page', 1, type=int), 1)
+    size = current_app.config['SEARCH_PAGE_SIZE']
+    classes, tasks = current_user.search(text, current_app.config['SEARCH_MAX_RESULTS']) if text else ([], [])
+    start = (page - 1) * size
+    return render_template(
+        'search.html', query=text, page=page, has_next=len(tasks) > start + size,
+        classes=[ClassView.from_document(document) for document in classes] if page == 1 else [],
+        tasks=[TaskView.from_document(document) for document in tasks[start:start + size]]
+    )
+
+
 @pages.route('/archive')
 @login_required
+@user_data_etag
 def archive():
-    return render_template('archive.html')
+    limit = current_app.config['TASK_PAGE_SIZE']
+    tasks = current_user.get_tasks(order=-1, archived=True, unarchived=False, limit=limit + 1, view=True)
+    tasks, cursor = paginate(tasks, limit)
+    return render_template('archive.html', tasks=tasks, cursor=cursor)
+
+
+@pages.route('/api/tasks')
+@login_required
+def task_feed():
+    """
+    Return a page of the user's tasks as JSON, along with the cursor of the next page.
+
+    Query parameters: cursor, limit, order (1 or -1), class_id, category, archived (true or false; both if absent) and
+    start/end dates (YYYY-MM-DD, end exclusive).
+    """
+    args = request.args
+    limit = max(1, min(args.get('limit', current_app.config['TASK_PAGE_SIZE'], type=int),
+                       current_app.config['TASK_PAGE_SIZE_MAX']))
+    order = -1 if args.get('order') == '-1' else 1
+    archived = args.get('archived', '').lower()
+    try:
+        start = datetime.strptime(args['start'], '%Y-%m-%d') if 'start' in args else datetime.min
+        end = datetime.strptime(args['end'], '%Y-%m-%d') if 'end' in args else datetime.max
+    except ValueError:
+        abort(400)
+    query = dict(
+        limit=limit + 1,
+        view=True,
+        order=order,
+        time_range=(start, end) if ('start' in args or 'end' in args) else None,
+        archived=archived != 'false',
+        unarchived=archived != 'true',
+        category=args.get('category'),
+        after=decode_cursor(args['cursor']) if 'cursor' in args else None,
+    )
+    if 'class_id' in args:
+        try:
+            cls = Class(ObjectId(args['class_id']))
+        except InvalidId:
+            abort(400)
+        cls.flask_validate()
+        tasks = cls.get_tasks(**query)
+    else:
+        tasks = current_user.get_tasks(**query)
+    tasks, cursor = paginate(tasks, limit)
+    show_class = 'class_id' not in args
+    cards = fragments.task_cards(tasks, show_class=show_class)
+    return jsonify({
+        'tasks': [{
+            'id': str(task.get_id()),
+            'class_id': str(task.class_id),
+            'name': task.name,
+            'description': task.description,
+            'category': task.category,
+            'date': task.date and task.date.isoformat(),
+            'archived': task.archived,
+            'html': card,
+        } for task, card in zip(tasks, cards)],
+        'next': cursor,
+    })
 
 
 @pages.route('/calendar/')
 @pages.route('/calendar/<int:year>/<int:month>')
 @login_required
+@user_data_etag
 def calendar(year=None, month=None):
     today = datetime.today().date()
     if year and month and (not (1900 <= year <= 9999) or not(1 <= month <= 12)):
@@ -239,7 +434,45 @@ def calendar(year=None, month=None):
     # from pprint import PrettyPrinter
     # pp = PrettyPrinter()
     # pp.pprint(cal.calendar)
-    return render_template('calendar.html', calendar=cal)
+    token = current_app.ts.dumps(current_user.get_id(), salt='calendar-feed')
+    feed_url = url_for('pages.calendar_feed', token=token, _external=True)
+    return render_template('calendar.html', calendar=cal, feed_url=feed_url)
+
+
+@pages.route('/calendar/feed/<token>.ics')
+def calendar_feed(token):
+    """
+    Stream a user's unarchived dated tasks as an iCalendar feed.
+
+    The validators come from the user's classes alone (their names, task_version and modification dates), so an
+    unchanged feed is answered with a 304 without reading any task.
+    """
+    try:
+        user = User(current_app.ts.loads(token, salt='calendar-feed'))
+    except BadSignature:
+        abort(404)
+    if not user.exists():
+        abort(404)
+    classes = list(user.get_classes(archived=False, projection=['name', 'task_version', 'modified', 'tasks_modified']))
+    etag = hashlib.sha1(repr(sorted(
+        (str(cls.get_id()), cls.mongo_get('name'), cls.mongo_get('task_version', default=0)) for cls in classes
+    )).encode('utf-8')).hexdigest()
+    dates = [user.mongo_get('modified')]
+    dates += [cls.mongo_get(key) for cls in classes for key in ('modified', 'tasks_modified')]
+    last_modified = max((date for date in dates if date is not None), default=None)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        class_names = {cls.get_id(): cls.mongo_get('name') for cls in classes}
+        tasks = Task.find(class_names, order=0, archived=False, time_range=(datetime.min, datetime.max),
+                          projection=['name', 'description', 'category', 'date', 'class_id'])
+        response = Response(stream_with_context(ical.generate_calendar(tasks, class_names)),
+                            mimetype='text/calendar')
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
 
 
 @pages.route('/account')
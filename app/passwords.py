@@ -0,0 +1,74 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many hashes are already waiting for the pool."""
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, str) else value
+
+
+def _hash(password, rounds):
+    import bcrypt  # Imported in the pool's processes only
+    return bcrypt.hashpw(_to_bytes(password), bcrypt.gensalt(rounds))
+
+
+def _check(password_hash, password):
+    import bcrypt
+    return bcrypt.checkpw(_to_bytes(password), _to_bytes(password_hash))
+
+
+class PasswordHasher:
+    """
+    Hash and check bcrypt passwords in a bounded pool of processes instead of on the request thread.
+
+    At most max_pending jobs may be running or waiting at once; past that, PasswordHasherBusy is raised right away so
+    the request can be shed instead of queueing behind the others. The pool is created lazily in each process, so it
+    is never shared by forked workers.
+    """
+
+    def __init__(self, rounds=12, processes=None, max_pending=None):
+        self.rounds = rounds
+        self.processes = processes or os.cpu_count() or 1
+        self.max_pending = max_pending or self.processes * 2
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(self.processes)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password_hash, password):
+        if not password_hash:
+            return False
+        return self._run(_check, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Return whether a hash was made with a different cost factor than the configured one."""
+        return int(_to_bytes(password_hash).split(b'$')[2]) != self.rounds
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+            self._pid = None
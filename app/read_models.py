@@ -0,0 +1,58 @@
+"""
+Immutable read models for list pages.
+
+A TaskView or ClassView is a named tuple built straight from a projected cursor row. It carries only the fields the
+cards and forms use, with no per-instance dict, document copy or cache, so a page of them costs a fraction of the
+memory of the equivalent Task and Class instances. Use the models for anything that writes or authorizes.
+"""
+from collections import namedtuple
+
+
+class TaskView(namedtuple('TaskView', 'id class_id class_name owner_id name description date category archived '
+                                      'version')):
+    __slots__ = ()
+
+    projection = ['class_id', 'class', 'name', 'description', 'date', 'category', 'archived', 'version']
+
+    @classmethod
+    def from_document(cls, document):
+        summary = document.get('class') or {}
+        return cls(
+            document['_id'],
+            document.get('class_id'),
+            summary.get('name'),
+            summary.get('owner_id'),
+            document.get('name'),
+            document.get('description'),
+            document.get('date'),
+            document.get('category'),
+            document.get('archived'),
+            document.get('version', 0),
+        )
+
+    def get_id(self):
+        return self.id
+
+    def user_owns_class(self, user):
+        """Return whether a user owns the task's class according to the task's copy of the class summary."""
+        return self.owner_id is not None and user.get_id() == self.owner_id
+
+
+class ClassView(namedtuple('ClassView', 'id name description owner_id archived version')):
+    __slots__ = ()
+
+    projection = ['name', 'description', 'owner_id', 'archived', 'version']
+
+    @classmethod
+    def from_document(cls, document):
+        return cls(
+            document['_id'],
+            document.get('name'),
+            document.get('description'),
+            document.get('owner_id'),
+            document.get('archived'),
+            document.get('version', 0),
+        )
+
+    def get_id(self):
+        return self.id
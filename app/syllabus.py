@@ -0,0 +1,66 @@
+"""Importing a class's tasks from a CSV or iCalendar syllabus."""
+import csv
+from datetime import datetime
+from itertools import islice
+
+from werkzeug.datastructures import MultiDict
+
+from app import ical
+from app.forms import TaskForm
+from app.models import Task
+
+CSV_COLUMNS = ('name', 'date', 'time', 'category', 'description')
+CATEGORIES = {category.lower(): category for category in Task.categories}
+
+
+def read_csv(lines):
+    """Yield the rows of a CSV syllabus with name, date (YYYY-MM-DD), time (HH:MM), category and description columns."""
+    for row in csv.DictReader(lines):
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        yield {column: row.get(column, '') for column in CSV_COLUMNS}
+
+
+def read_ics(lines):
+    """Yield the events of an iCalendar syllabus as rows like those of read_csv."""
+    for event in ical.read_events(lines):
+        start = event.get('DTSTART', ([], ''))[1]
+        categories = ical.unescape(event.get('CATEGORIES', ([], ''))[1])
+        yield {
+            'name': ical.unescape(event.get('SUMMARY', ([], ''))[1]),
+            'date': '{}-{}-{}'.format(start[:4], start[4:6], start[6:8]) if start else '',
+            'time': '{}:{}'.format(start[9:11], start[11:13]) if 'T' in start else '',
+            'category': categories.split(',')[0].strip(),
+            'description': ical.unescape(event.get('DESCRIPTION', ([], ''))[1]),
+        }
+
+
+def validate(rows, errors):
+    """
+    Yield a (name, date, category, description) task for each row that TaskForm accepts.
+
+    Rows are checked by TaskForm itself, so imports follow the rules of the New Task page, and must also have a date.
+    Each rejected row is appended to errors as (row number, messages).
+    """
+    for number, row in enumerate(rows, start=1):
+        row['category'] = CATEGORIES.get(row['category'].lower(), row['category'])
+        form = TaskForm(formdata=MultiDict(row), meta={'csrf': False})
+        if not form.validate():
+            errors.append((number, [message for messages in form.errors.values() for message in messages]))
+            continue
+        date = form.date.data
+        if date is None:
+            errors.append((number, ['Please give the task a date.']))
+            continue
+        yield form.name.data, datetime.combine(date, form.time.data or datetime.min.time()), form.category.data, \
+            form.description.data
+
+
+def import_tasks(cls, lines, filename, max_rows, batch_size):
+    """Create a class's tasks from a syllabus file as it is read, returning (tasks created, row errors)."""
+    read = read_ics if filename.lower().endswith('.ics') else read_csv
+    errors = []
+    rows = read(lines)
+    created = cls.create_tasks(validate(islice(rows, max_rows), errors), batch_size=batch_size)
+    if next(rows, None) is not None:
+        errors.append((max_rows + 1, ['Only the first {} rows were imported.'.format(max_rows)]))
+    return created, errors
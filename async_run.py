@@ -0,0 +1,9 @@
+"""
+Entry point of the read API: gunicorn async_run:app --worker-class aiohttp.GunicornWebWorker
+
+Heroku sends outside traffic only to the web process type, so deploy it there as its own app from this repo, with that
+command as its web process and the same MONGODB_URI, SECRET_KEY and SESSION_COOKIE_DOMAIN as the main app.
+"""
+from app.async_api import create_async_app
+
+app = create_async_app()
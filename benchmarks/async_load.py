@@ -0,0 +1,57 @@
+"""
+Compare concurrent-request throughput of the sync Flask app and the async read API on the same machine.
+
+Start both servers first, for example `gunicorn run:app -b :8000` and
+`gunicorn async_run:app -b :8080 --worker-class aiohttp.GunicornWebWorker` with the same number of workers, then log in
+through the Flask app and pass its session cookie.
+
+Usage: python -m benchmarks.async_load --cookie <session> [--concurrency 50] [--requests 1000]
+           [--sync-url http://localhost:8000/api/tasks?archived=false]
+           [--async-url http://localhost:8080/api/read/tasks?archived=false]
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+
+async def load(url, cookie, concurrency, requests):
+    latencies = []
+    remaining = iter(range(requests))
+
+    async def worker(session):
+        for _ in remaining:
+            start = time.perf_counter()
+            async with session.get(url) as response:
+                await response.read()
+                if response.status != 200:
+                    raise RuntimeError('{} returned {}'.format(url, response.status))
+            latencies.append(time.perf_counter() - start)
+
+    async with aiohttp.ClientSession(cookies={'session': cookie},
+                                     connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cookie', required=True, help='The Flask session cookie of a logged in user.')
+    parser.add_argument('--sync-url', default='http://localhost:8000/api/tasks?archived=false')
+    parser.add_argument('--async-url', default='http://localhost:8080/api/read/tasks?archived=false')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    for name, url in (('sync', args.sync_url), ('async', args.async_url)):
+        rate, p50, p95 = loop.run_until_complete(load(url, args.cookie, args.concurrency, args.requests))
+        print('{:<6} {:>8.1f} req/sec  p50 {:>7.1f} ms  p95 {:>7.1f} ms'.format(name, rate, p50 * 1000, p95 * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+End-to-end benchmark: seed a local mongod with a synthetic population and drive the real app through its test client.
+
+Mongo operations are counted with a pymongo CommandListener, so this needs a real mongod rather than mongomock.
+
+Reports p50/p95 latency, Mongo operations per request and throughput for every endpoint. With --save-baseline the
+results are stored; with --baseline they are compared against a stored run, and the benchmark exits with status 1 if
+any endpoint now issues more Mongo operations or its p95 latency grew by more than --tolerance.
+
+The users and requests are drawn from a fixed seed, so with the default sizes the Mongo operations per request are the
+same on every machine, while latency depends on it. A baseline meant to be shared, say in CI, should keep only the
+counts. Save one before a change, or refresh it after an intended change in query counts, with
+
+    python -m benchmarks.e2e --ops-only --save-baseline benchmarks/baseline.json
+
+and check a change against it with
+
+    python -m benchmarks.e2e --baseline benchmarks/baseline.json
+
+Usage: python -m benchmarks.e2e [--mongo-uri mongodb://localhost:27017/hwplan_bench] [--users 20] [--classes 5]
+                                [--tasks 100] [--members 30] [--requests 50] [--baseline benchmarks/baseline.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Count the Mongo commands issued by the current thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def reset(self):
+        self._local.count = 0
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def seed(db, users, classes_per_user, tasks_per_class, members_per_class):
+    """Insert a synthetic population and return the class ids of every user."""
+    for name in ('users', 'classes', 'tasks'):
+        db[name].delete_many({})
+    rng = random.Random(0)
+    now = datetime.utcnow().replace(microsecond=0)
+    user_ids = list(range(users))
+    memberships = {user_id: [] for user_id in user_ids}
+    classes = []
+    tasks = []
+    for owner_id in user_ids:
+        for i in range(classes_per_user):
+            class_id = ObjectId()
+            member_ids = rng.sample([u for u in user_ids if u != owner_id], min(members_per_class, users - 1))
+            for user_id in [owner_id] + member_ids:
+                memberships[user_id].append(class_id)
+            class_name = 'Class {}-{}'.format(owner_id, i)
+            classes.append({
+                '_id': class_id,
+                'name': class_name,
+                'owner_id': owner_id,
+                'description': 'A synthetic class.',
+                'archived': False,
+                'date_created': now,
+                'member_ids': member_ids,
+            })
+            tasks.extend({
+                'name': 'Task {}'.format(j),
+                'class_id': class_id,
+                'class': {'name': class_name, 'owner_id': owner_id},
+                'archived': rng.random() < 0.3,
+                'description': 'A synthetic task.',
+                'date': now + timedelta(days=rng.randint(-60, 60), hours=rng.randint(0, 23)),
+                'category': 'Homework',
+                'date_created': now,
+                'version': 0,
+            } for j in range(tasks_per_class))
+    db.users.insert_many([{
+        '_id': user_id,
+        'email': 'user{}@example.com'.format(user_id),
+        'password': b'',
+        'registered_on': now,
+        'class_ids': memberships[user_id],
+        'display_name': 'user{}'.format(user_id),
+        'verified': True,
+    } for user_id in user_ids])
+    if classes:
+        db.classes.insert_many(classes)
+    if tasks:
+        db.tasks.insert_many(tasks)
+    return memberships
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(app, counter, memberships, requests, seed=0):
+    rng = random.Random(seed)
+    db = app.mongo.db
+    today = datetime.today()
+    endpoints = {
+        'home': lambda: ('GET', '/home', None),
+        'calendar': lambda: ('GET', '/calendar/{}/{}'.format(today.year, today.month), None),
+        'archive': lambda: ('GET', '/archive', None),
+    }
+    owned_tasks = {}
+
+    def owned_task(user_id):
+        if user_id not in owned_tasks:
+            owned = [cls['_id'] for cls in db.classes.find({'owner_id': user_id}, ['_id'])]
+            owned_tasks[user_id] = [task['_id'] for task in db.tasks.find({'class_id': {'$in': owned}}, ['_id'])]
+        return rng.choice(owned_tasks[user_id])
+
+    results = {}
+    for name in list(endpoints) + ['view_class', 'edit_task', 'archive_task']:
+        latencies, operations = [], []
+        start = time.perf_counter()
+        for i in range(requests):
+            user_id = rng.choice(sorted(memberships))
+            if name == 'view_class':
+                request = ('GET', '/class/view/{}'.format(rng.choice(memberships[user_id])), None)
+            elif name == 'edit_task':
+                request = ('POST', '/task/edit/{}'.format(owned_task(user_id)), {
+                    'name': 'Edited {}'.format(i), 'description': 'Edited.', 'category': 'Homework',
+                    'date': today.strftime('%Y-%m-%d'), 'time': '12:00'})
+            elif name == 'archive_task':
+                action = 'archive' if i % 2 == 0 else 'unarchive'
+                request = ('POST', '/task/{}/{}'.format(action, owned_task(user_id)), None)
+            else:
+                request = endpoints[name]()
+            with app.test_client() as client:
+                with client.session_transaction() as session:
+                    session['user_id'] = user_id
+                    session['_fresh'] = True
+                method, url, data = request
+                counter.reset()
+                request_start = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                latencies.append(time.perf_counter() - request_start)
+                operations.append(counter.count)
+                if response.status_code >= 400:
+                    raise RuntimeError('{} {} returned {}'.format(method, url, response.status_code))
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'mongo_ops': sum(operations) / len(operations),
+            'requests_per_sec': requests / elapsed,
+        }
+    return results
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        if result['mongo_ops'] > baseline[name]['mongo_ops']:
+            regressions.append('{}: {:.1f} Mongo ops per request, baseline {:.1f}'.format(
+                name, result['mongo_ops'], baseline[name]['mongo_ops']))
+        if 'p95_ms' in baseline[name] and result['p95_ms'] > baseline[name]['p95_ms'] * (1 + tolerance):
+            regressions.append('{}: p95 {:.1f} ms, baseline {:.1f} ms'.format(
+                name, result['p95_ms'], baseline[name]['p95_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/hwplan_bench')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--classes', type=int, default=5, help='Classes owned by each user.')
+    parser.add_argument('--tasks', type=int, default=100, help='Tasks in each class.')
+    parser.add_argument('--members', type=int, default=30, help='Students in each class.')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint.')
+    parser.add_argument('--baseline', help='Compare against this stored run.')
+    parser.add_argument('--save-baseline', help='Store this run here.')
+    parser.add_argument('--ops-only', action='store_true', help='Store only the Mongo operation counts.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p95 growth.')
+    args = parser.parse_args()
+    if 'bench' not in args.mongo_uri.rsplit('/', 1)[-1]:
+        parser.error('The benchmark replaces the users, classes and tasks it finds; use a database named *bench*.')
+
+    os.environ.update({
+        'MONGODB_URI': args.mongo_uri,
+        'SECRET_KEY': 'benchmark',
+        'MAIL_TRANSPORT': 'fake',
+        'MAIL_WORKERS': '0',
+        'BCRYPT_LOG_ROUNDS': '4',
+        'USER_CACHE_TTL': '3600',  # Keeps the operation counts independent of how long the run takes
+    })
+    counter = CommandCounter()
+    monitoring.register(counter)  # Must happen before the app creates its client
+
+    from app import create_app, setup_db
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        setup_db()
+        memberships = seed(app.mongo.db, args.users, args.classes, args.tasks, args.members)
+    classes = args.users * args.classes
+    print('Seeded {} users, {} classes, {} tasks'.format(args.users, classes, classes * args.tasks))
+
+    results = run(app, counter, memberships, args.requests)
+    print('{:<14}{:>10}{:>10}{:>12}{:>12}'.format('endpoint', 'p50 ms', 'p95 ms', 'mongo ops', 'req/sec'))
+    for name, result in results.items():
+        print('{:<14}{p50_ms:>10.1f}{p95_ms:>10.1f}{mongo_ops:>12.1f}{requests_per_sec:>12.1f}'.format(name, **result))
+
+    if args.save_baseline:
+        saved = {name: {'mongo_ops': result['mongo_ops']} for name, result in results.items()} if args.ops_only \
+            else results
+        with open(args.save_baseline, 'w') as f:
+            json.dump(saved, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
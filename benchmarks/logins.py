@@ -0,0 +1,55 @@
+"""
+Measure password checks (logins) per second under concurrency, inline on request threads and through the pool.
+
+Usage: python -m benchmarks.logins [--threads 16] [--logins 200] [--rounds 12]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from app.passwords import PasswordHasher, PasswordHasherBusy
+
+
+def run(check, threads, logins):
+    shed = 0
+
+    def login(_):
+        nonlocal shed
+        try:
+            check()
+        except PasswordHasherBusy:
+            shed += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    return (logins - shed) / elapsed, shed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--max-pending', type=int, default=None)
+    args = parser.parse_args()
+
+    password = 'correct horse battery staple'
+    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(args.rounds))
+
+    rate, _ = run(lambda: bcrypt.checkpw(password.encode('utf-8'), password_hash), args.threads, args.logins)
+    print('inline: {:.1f} logins/sec'.format(rate))
+
+    hasher = PasswordHasher(rounds=args.rounds, processes=args.processes, max_pending=args.max_pending)
+    hasher.check(password_hash, password)  # Start the pool outside of the measurement
+    rate, shed = run(lambda: hasher.check(password_hash, password), args.threads, args.logins)
+    print('pool ({} processes): {:.1f} logins/sec, {} shed'.format(hasher.processes, rate, shed))
+    hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Compare the memory used to render task cards from Task instances and from TaskView read models.
+
+Each mode runs in a fresh process, which builds its objects from synthetic cursor rows (full documents for Task,
+projected ones for TaskView) and renders every card without the fragment cache. Peak RSS and the peak Python heap
+(tracemalloc) are reported. No database is needed.
+
+Usage: python -m benchmarks.memory [--tasks 10000]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+
+def documents(count, projection=None):
+    """Yield synthetic task documents as a cursor would, keeping only the projected fields if one is given."""
+    now = datetime.utcnow().replace(microsecond=0)
+    class_id = ObjectId()
+    for i in range(count):
+        document = {
+            '_id': ObjectId(),
+            'name': 'Task {}'.format(i),
+            'class_id': class_id,
+            'class': {'name': 'Class', 'owner_id': 0},
+            'archived': False,
+            'description': 'A synthetic task with a description of a realistic length. ' * 3,
+            'date': now + timedelta(hours=i),
+            'category': 'Homework',
+            'date_created': now,
+            'modified': now,
+            'version': 1,
+        }
+        if projection is not None:
+            document = {key: value for key, value in document.items() if key == '_id' or key in projection}
+        yield document
+
+
+def measure(mode, count):
+    os.environ.update({'SECRET_KEY': 'benchmark', 'MAIL_TRANSPORT': 'fake', 'MAIL_WORKERS': '0'})
+    from app import create_app
+    from app.models import Task, User
+    from app.read_models import TaskView
+    app = create_app()
+    user = User(0, is_authenticated=True, document={'_id': 0, 'class_ids': []})
+    with app.test_request_context():
+        cards = app.jinja_env.get_template('cards.html').make_module({'current_user': user})
+        tracemalloc.start()
+        if mode == 'task':
+            tasks = [Task.from_document(document) for document in documents(count)]
+        else:
+            tasks = [TaskView.from_document(document) for document in documents(count, TaskView.projection)]
+        html = [str(cards.task_card(task, show_class=True)) for task in tasks]
+        heap_peak = tracemalloc.get_traced_memory()[1]
+    return {
+        'mode': mode,
+        'cards': len(html),
+        'heap_peak_mb': heap_peak / 2 ** 20,
+        'rss_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10,  # ru_maxrss is in KiB on Linux
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--mode', choices=('task', 'view'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(measure(args.mode, args.tasks)))
+        return
+
+    print('{:<8}{:>10}{:>16}{:>16}'.format('mode', 'cards', 'heap peak MB', 'RSS peak MB'))
+    for mode in ('task', 'view'):
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.memory', '--mode', mode,
+                                          '--tasks', str(args.tasks)])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{mode:<8}{cards:>10}{heap_peak_mb:>16.1f}{rss_peak_mb:>16.1f}'.format(**result))
+
+
+if __name__ == '__main__':
+    main()
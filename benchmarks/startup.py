@@ -0,0 +1,66 @@
+"""
+Measure a worker's cold start: importing the app, create_app() and the first response, each in a fresh process.
+
+The first response is a GET of /login, which renders templates without touching Mongo. Runs are repeated without a
+template bytecode cache and with one filled by `flask compile-templates`, and the medians are reported.
+
+Usage: python -m benchmarks.startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def measure():
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    flask_app = app.create_app()
+    created = time.perf_counter()
+    response = flask_app.test_client().get('/login')
+    responded = time.perf_counter()
+    if response.status_code != 200:
+        raise RuntimeError('/login returned {}'.format(response.status_code))
+    return {
+        'import_ms': (imported - start) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'first_response_ms': (responded - created) * 1000,
+        'total_ms': (responded - start) * 1000,
+    }
+
+
+def run(env, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.startup', '--measure'], env=env)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {key: statistics.median(result[key] for result in results) for key in results[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure()))
+        return
+
+    print('{:<18}{:>12}{:>16}{:>20}{:>12}'.format('templates', 'import ms', 'create_app ms', 'first response ms',
+                                                  'total ms'))
+    env = dict(os.environ, SECRET_KEY='benchmark', MAIL_TRANSPORT='fake', MAIL_WORKERS='0', FLASK_APP='run.py')
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.check_call(['flask', 'compile-templates'], env=dict(env, TEMPLATE_CACHE_DIR=directory))
+        for name, cache_dir in (('compiled on use', ''), ('precompiled', directory)):
+            result = run(dict(env, TEMPLATE_CACHE_DIR=cache_dir), args.runs)
+            print('{:<18}{import_ms:>12.1f}{create_app_ms:>16.1f}{first_response_ms:>20.1f}{total_ms:>12.1f}'
+                  .format(name, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,42 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 MONGO_URI = os.getenv("MONGODB_URI")
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 SENDGRID_DEFAULT_FROM = os.getenv("app66643755@heroku.com")
+CALENDAR_CACHE_SIZE = int(os.getenv("CALENDAR_CACHE_SIZE", 1024))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+FRAGMENT_CACHE_BACKEND = os.getenv("FRAGMENT_CACHE_BACKEND", "memory")  # "memory" or "mongo" to share between workers
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", 10000))
+MAIL_TRANSPORT = os.getenv("MAIL_TRANSPORT", "sendgrid")  # "sendgrid" or "fake" to keep messages in memory
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", 2))  # Per process; 0 leaves delivery to `flask send-mail`
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+MAIL_RETRY_DELAY = float(os.getenv("MAIL_RETRY_DELAY", 30))  # Seconds, doubled after every failed attempt
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", 5))
+MAIL_LEASE = float(os.getenv("MAIL_LEASE", 300))  # Seconds before a message claimed by a dead worker is retried
+BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))  # Existing hashes are upgraded on the next login
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", 2))  # gunicorn worker processes, read by gunicorn.conf.py too
+WEB_THREADS = int(os.getenv("WEB_THREADS", 8))  # Request threads per gunicorn worker
+# Each worker has its own pool, so the CPUs are split between the workers instead of every worker taking all of them
+BCRYPT_PROCESSES = int(os.getenv("BCRYPT_PROCESSES", 0)) or max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", 0)) or None  # Defaults to 2 jobs per process
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))  # Bounds how stale another worker's cached user can get
+TASK_PAGE_SIZE = int(os.getenv("TASK_PAGE_SIZE", 20))
+TASK_PAGE_SIZE_MAX = int(os.getenv("TASK_PAGE_SIZE_MAX", 100))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 20))
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 100))  # Best matches kept for paging through
+TASK_BULK_MAX = int(os.getenv("TASK_BULK_MAX", 1000))  # Task ids accepted by one bulk archive/delete request
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 5000))  # Rows read from one syllabus upload
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 500))  # Tasks per insert_many when importing a syllabus
+USER_ID_BLOCK_SIZE = int(os.getenv("USER_ID_BLOCK_SIZE", 20))  # User ids reserved per counter round trip
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", os.path.join(os.path.abspath(os.path.dirname(__file__)), "cache"))
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", 100))  # Connections per worker process
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", 0)) or None
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0)) or None  # Waits for a free connection
+MONGO_WARMUP_CONNECTIONS = int(os.getenv("MONGO_WARMUP_CONNECTIONS", 4))  # Opened by each worker before it is ready
+SESSION_COOKIE_DOMAIN = os.getenv("SESSION_COOKIE_DOMAIN") or None  # e.g. ".example.com" to share it with the read API
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # Bearer token for /metrics, which is disabled without one
+MONGO_DEBUG_HEADER = os.getenv("MONGO_DEBUG_HEADER", "") == "1"  # Adds X-Mongo-Commands/X-Mongo-Time to responses
+DEPLOY_VERSION = os.getenv("HEROKU_RELEASE_VERSION", "")  # Part of page ETags, so a deploy invalidates them
@@ -0,0 +1,15 @@
+"""Gunicorn settings for the web process (see the Procfile)."""
+import config
+
+# Threaded workers, so a login waiting on the bcrypt pool holds one thread while the others keep serving requests.
+# Past BCRYPT_MAX_PENDING concurrent hashes in a worker, further logins are shed with a 503.
+worker_class = 'gthread'
+workers = config.WEB_CONCURRENCY
+threads = config.WEB_THREADS
+
+
+def post_fork(server, worker):
+    """Warm the new worker's own Mongo connections in the background; /healthz answers 503 until they are ready."""
+    from run import app
+
+    app.mongo.start_warm_up(on_error=lambda e: server.log.error('Mongo warmup failed in worker %s: %s', worker.pid, e))